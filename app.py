@@ -20,29 +20,128 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
+import itertools
+import json
+import os
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
 import hou
 import sgtk
 from hou import Node
 
+__all__ = ["MetadataConfig", "TkHoudiniRenderMan"]
+
+WORK_FILE_EVENTS = frozenset(
+    (
+        hou.hipFileEventType.AfterClear,
+        hou.hipFileEventType.AfterLoad,
+        hou.hipFileEventType.AfterSave,
+    )
+)
+VALID_METADATA_TYPES = frozenset(("string", "int", "float"))
+RESERVED_METADATA_KEYS = frozenset(("renderlightgroups", "postrendergroups"))
+METADATA_CACHE_FILE = "validated_metadata.json"
+
+
+@dataclass(frozen=True)
+class MetadataConfig:
+    """Normalized entry of the render_metadata setting"""
+
+    key: str
+    key_lc: str
+    type: str
+    expression: Optional[str] = None
+    value: Optional[str] = None
+    group: Optional[str] = None
+
+    @classmethod
+    def from_setting(cls, metadata: dict) -> "MetadataConfig":
+        """Create a config entry from a raw render_metadata setting item
+
+        Args:
+            metadata (dict): Setting item
+        """
+        key = metadata.get("key")
+        return cls(
+            key=key,
+            key_lc=(key or "").lower(),
+            type=metadata.get("type"),
+            expression=metadata.get("expression"),
+            value=metadata.get("value"),
+            group=metadata.get("group"),
+        )
+
 
 class TkHoudiniRenderMan(sgtk.platform.Application):
+    # sgtk.platform.Application keeps its own __dict__, these only cover the
+    # attributes set on this subclass
+    __slots__ = (
+        "handler",
+        "_metadata_config",
+        "_work_template",
+        "_render_template",
+        "_fields_cache",
+    )
+
     def init_app(self):
         """Initialize the app."""
         tk_houdini_usdrop = self.import_module("tk_houdini_renderman")
         self.handler = tk_houdini_usdrop.TkRenderManNodeHandler(self)
 
-        types = ("string", "int", "float")
+        self._work_template = self.get_template("work_file_template")
+        self._render_template = self.get_template("output_render_template")
+
+        raw_metadata_config = self.get_setting("render_metadata")
+        self._metadata_config = tuple(
+            MetadataConfig.from_setting(metadata) for metadata in raw_metadata_config
+        )
+        self._validate_metadata_config(raw_metadata_config)
+
+        self._fields_cache: dict[str, dict] = {}
+        hou.hipFile.addEventCallback(self._on_hip_file_event)
+
+    def _validate_metadata_config(self, raw_metadata_config: list[dict]):
+        """Validate the render metadata config
+
+        A digest of the last successfully validated config is stored in the
+        app cache location, so an unchanged config is only validated once. The
+        app version and validation rules are part of the digest, so changed
+        rules trigger a new validation.
+
+        Args:
+            raw_metadata_config (list[dict]): The render_metadata setting
+        """
+        payload = {
+            "version": self.version,
+            "valid_types": sorted(VALID_METADATA_TYPES),
+            "reserved_keys": sorted(RESERVED_METADATA_KEYS),
+            "config": raw_metadata_config,
+        }
+        digest = hashlib.blake2b(
+            json.dumps(payload, sort_keys=True).encode(), digest_size=16
+        ).hexdigest()
+        cache_path = os.path.join(self.cache_location, METADATA_CACHE_FILE)
+
+        try:
+            with open(cache_path, "r") as cache_file:
+                if json.load(cache_file).get("digest") == digest:
+                    return
+        except (OSError, ValueError, AttributeError):
+            pass
+
         failed = False
-        for metadata in self.get_setting("render_metadata"):
-            if metadata.get("key").lower() == "renderlightgroups":
-                self.logger.error('Reserved metadata key "RenderLightGroups" was used.')
+        for metadata in self._metadata_config:
+            if metadata.key_lc in RESERVED_METADATA_KEYS:
+                self.logger.error('Reserved metadata key "%s" was used.', metadata.key)
                 failed = True
-            if metadata.get("key").lower() == "postrendergroups":
-                self.logger.error('Reserved metadata key "PostRenderGroups" was used.')
-                failed = True
-            if metadata.get("type") not in types:
-                msg = f"Invalid metadata type for key '{metadata.get('key')}': '{metadata.get('type')}'"
-                self.logger.error(msg)
+            if metadata.type not in VALID_METADATA_TYPES:
+                self.logger.error(
+                    "Invalid metadata type for key '%s': '%s'",
+                    metadata.key,
+                    metadata.type,
+                )
                 failed = True
         if failed:
             raise ValueError(
@@ -50,6 +149,30 @@ class TkHoudiniRenderMan(sgtk.platform.Application):
                 "and try again."
             )
 
+        try:
+            os.makedirs(self.cache_location, exist_ok=True)
+            with open(cache_path, "w") as cache_file:
+                json.dump({"digest": digest}, cache_file)
+        except OSError as e:
+            self.logger.debug("Couldn't cache validated metadata config: %s", e)
+
+    def destroy_app(self):
+        """Clean up the app."""
+        hou.hipFile.removeEventCallback(self._on_hip_file_event)
+
+    def _on_hip_file_event(self, event_type: hou.hipFileEventType):
+        """Invalidate the work fields cache when the hip file changes
+
+        Args:
+            event_type (hou.hipFileEventType): Type of the hip file event
+        """
+        if event_type in WORK_FILE_EVENTS:
+            self._fields_cache.clear()
+
+    def get_metadata_config(self) -> tuple[MetadataConfig, ...]:
+        """Get the validated render metadata config"""
+        return self._metadata_config
+
     def execute_render(self, node: hou.Node):
         """Start farm render
 
@@ -76,11 +199,24 @@ class TkHoudiniRenderMan(sgtk.platform.Application):
         self.handler.copy_to_clipboard(node, network)
 
     @staticmethod
-    def get_all_renderman_nodes() -> tuple[Node]:
-        """Get all nodes from node type sgtk_hdprman"""
-        rop_nodes = hou.ropNodeTypeCategory().nodeType("sgtk_ris").instances()
-        lop_nodes = hou.lopNodeTypeCategory().nodeType("sgtk_ris").instances()
-        return rop_nodes + lop_nodes
+    def get_all_renderman_nodes() -> tuple[Node, ...]:
+        """Get all nodes from node type sgtk_hdprman
+
+        Prefer iter_all_renderman_nodes when only iterating once.
+        """
+        return tuple(TkHoudiniRenderMan.iter_all_renderman_nodes())
+
+    @staticmethod
+    def iter_all_renderman_nodes() -> Iterator[Node]:
+        """Iterate over all nodes from node type sgtk_hdprman
+
+        Chains the current node type instances without building the combined
+        tuple, so nodes created or deleted since a previous call are reflected.
+        """
+        return itertools.chain(
+            hou.ropNodeTypeCategory().nodeType("sgtk_ris").instances(),
+            hou.lopNodeTypeCategory().nodeType("sgtk_ris").instances(),
+        )
 
     def get_output_path(
         self, node: hou.Node, aov_name: str, network: str = "rop"
@@ -139,11 +275,23 @@ class TkHoudiniRenderMan(sgtk.platform.Application):
 
     def get_work_template(self) -> str:
         """Get work file template from ShotGrid"""
-        return self.get_template("work_file_template")
+        return self._work_template
 
     def get_render_template(self) -> str:
         """Get render file template from ShotGrid"""
-        return self.get_template("output_render_template")
+        return self._render_template
+
+    def get_work_fields(self, file_path: str) -> dict:
+        """Get the work template fields for a hip file, cached per path
+
+        Args:
+            file_path (str): Hip file path
+        """
+        fields = self._fields_cache.get(file_path)
+        if fields is None:
+            fields = self._work_template.get_fields(file_path)
+            self._fields_cache[file_path] = fields
+        return dict(fields)
 
     @staticmethod
     def get_render_name(node) -> str:
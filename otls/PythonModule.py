@@ -1,14 +1,25 @@
+import functools
 import json
 import os
+import time
 
 import hou
+import sgtk
 
+_APP = None
 
-def render(node: hou.Node, on_farm: bool = False):
-    import sgtk
 
-    eng = sgtk.platform.current_engine()
-    app = eng.apps["tk-houdini-renderman"]
+def _app():
+    """Get the tk-houdini-renderman app, cached for as long as the engine is running"""
+    global _APP
+    engine = sgtk.platform.current_engine()
+    if _APP is None or _APP.engine is not engine:
+        _APP = engine.apps["tk-houdini-renderman"]
+    return _APP
+
+
+def render(node: hou.Node, on_farm: bool = False):
+    app = _app()
 
     if not setup_aovs(node, False):
         return
@@ -20,44 +31,34 @@ def render(node: hou.Node, on_farm: bool = False):
 
 
 def copy_to_clipboard(node: hou.Node):
-    import sgtk
-
-    eng = sgtk.platform.current_engine()
-    app = eng.apps["tk-houdini-renderman"]
-    app.copy_to_clipboard(node.node("render"))
+    _app().copy_to_clipboard(node.node("render"))
 
     hou.ui.displayMessage("Copied path to clipboard.")
 
 
 def setup_light_groups(node: hou.Node) -> bool:
-    import sgtk
-
-    eng = sgtk.platform.current_engine()
-    app = eng.apps["tk-houdini-renderman"]
-    return app.setup_light_groups(node)
+    return _app().setup_light_groups(node)
 
 
 def setup_aovs(node: hou.Node, show_notification: bool = True) -> bool:
-    import sgtk
-
-    eng = sgtk.platform.current_engine()
-    app = eng.apps["tk-houdini-renderman"]
-    return app.setup_aovs(node, show_notification)
+    return _app().setup_aovs(node, show_notification)
 
 
 def get_output_paths(node: hou.Node):
-    import sgtk
+    return _app().get_output_paths(node)
+
 
-    eng = sgtk.platform.current_engine()
-    app = eng.apps["tk-houdini-renderman"]
-    return app.get_output_paths(node)
+@functools.lru_cache(maxsize=64)
+def _file_exists(file_path: str, time_bucket: int) -> bool:
+    """Check if a file exists, cached per time bucket to avoid repeated stats"""
+    return os.path.exists(file_path)
 
 
 def open_stats():
     rman = hou.pwd().node("render")
     file_path = rman.evalParm("ri_statistics_xmlfilename")
 
-    if os.path.exists(file_path):
+    if _file_exists(file_path, int(time.time() // 2)):
         for pane in hou.ui.curDesktop().panes():
             if not pane.isSplitMinimized():
                 pane = pane.createTab(hou.paneTabType.HelpBrowser)
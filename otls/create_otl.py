@@ -1,16 +1,25 @@
+import functools
 import logging
+import pathlib
 import re
 import string
-import xml.etree.ElementTree as ET
+from collections import deque
 from enum import Enum
-from typing import Callable
+from types import MappingProxyType
+from typing import Callable, Iterable, Optional, Union
 
 import hou
 
+logger = logging.getLogger(__name__)
 
 # Run from Houdini python shell to build HDAs:
 # exec(open(r"D:\Developer\Pipeline\tk-houdini-renderman\otls\create_otl.py").read())
 
+REPO_ROOT = pathlib.Path(r"D:\Developer\Pipeline\tk-houdini-renderman")
+OTLS_DIR = REPO_ROOT / "otls"
+PYTHON_MODULE_FILE = OTLS_DIR / "PythonModule.py"
+ICON_FILE = REPO_ROOT / "images" / "rman_logo.svg"
+
 
 class OTLTypes(Enum):
     DRIVER = "driver"
@@ -190,6 +199,185 @@ OUTPUT_FILES = {
     },
 }
 
+# Submenu of a shelf tool, read from the Tools.shelf section of a node type
+TOOL_SUBMENU_RE = re.compile(r"<toolSubmenu>([^<]*)</toolSubmenu>")
+# Component name suffixes per parm naming scheme
+NAMING_SCHEMES = {
+    hou.parmNamingScheme.Base1: ("1", "2", "3", "4"),
+    hou.parmNamingScheme.XYZW: ("x", "y", "z", "w"),
+    hou.parmNamingScheme.XYWH: ("x", "y", "w", "h"),
+    hou.parmNamingScheme.UVW: ("u", "v", "w"),
+    hou.parmNamingScheme.RGBA: ("r", "g", "b", "a"),
+    hou.parmNamingScheme.MinMax: ("min", "max"),
+    hou.parmNamingScheme.MaxMin: ("max", "min"),
+    hou.parmNamingScheme.StartEnd: ("start", "end"),
+    hou.parmNamingScheme.BeginEnd: ("begin", "end"),
+}
+# Metadata value types, read-only as they are shared between builds
+METADATA_TYPES = tuple(
+    MappingProxyType(md_type)
+    for md_type in (
+        {"key": "float", "name": "Float", "type": "float", "components": 1},
+        {"key": "int", "name": "Integer", "type": "int", "components": 1},
+        {"key": "string", "name": "String", "type": "string", "components": 1},
+        {"key": "v2f", "name": "Vector 2 Float", "type": "float", "components": 2},
+        {"key": "v2i", "name": "Vector 2 Int", "type": "int", "components": 2},
+        {"key": "v3f", "name": "Vector 3 Float", "type": "float", "components": 3},
+        {"key": "v3i", "name": "Vector 3 Int", "type": "int", "components": 3},
+        {"key": "box2f", "name": "Box 2 Float", "type": "float", "components": 4},
+        {"key": "box2i", "name": "Box 2 Int", "type": "int", "components": 4},
+        {"key": "m33f", "name": "Matrix 3x3", "type": "float", "components": 9},
+        {"key": "m44f", "name": "Matrix 4x4", "type": "float", "components": 16},
+    )
+)
+METADATA_NAMES = tuple(md_type["key"] for md_type in METADATA_TYPES)
+METADATA_LABELS = tuple(md_type["name"] for md_type in METADATA_TYPES)
+# Expressions linking the LOP output files node to the render settings node
+OUTPUT_FILES_EXPRESSIONS = (
+    ("camera", 'chs("../render_settings/camera")'),
+    ("resolution1", 'ch("../render_settings/resolutionx")'),
+    ("resolution2", 'ch("../render_settings/resolutiony")'),
+    ("instantaneousShutter", 'ch("../render_settings/instantaneousShutter")'),
+    ("aspectRatioConformPolicy", 'chs("../render_settings/aspectRatioConformPolicy")'),
+    *(
+        (f"dataWindowNDC{i}", f'ch("../render_settings/dataWindowNDC{i}")')
+        for i in range(1, 4)
+    ),
+    ("pixelAspectRatio", 'ch("../render_settings/pixelAspectRatio")'),
+)
+# Wrangle snippet setting the metadata entries on the render products, $level is the
+# path to the node holding the entries
+METADATA_SNIPPET = string.Template(
+    'for (int i = 1; i <= chi("${level}metadata_entries"); i++) { \n\
+    string type = chs(sprintf("${level}metadata_%g_type", i)); \n\
+    string name = "driver:parameters:OpenEXR:" + chs(sprintf("${level}metadata_%g_key", i)); \n\
+    string value_name = sprintf("${level}metadata_%g_%s", i, type); \n\
+            \n\
+    if (type == "float") \n\
+        usd_setattrib(0, @primpath, name, chf(value_name)); \n\
+    else if (type == "int") \n\
+        usd_setattrib(0, @primpath, name, chi(value_name)); \n\
+    else if (type == "string") \n\
+        usd_setattrib(0, @primpath, name, chs(value_name)); \n\
+    else if (startswith(type, "v")) \n\
+        usd_setattrib(0, @primpath, name, chv(value_name)); \n\
+    else if (startswith(type, "bix")) \n\
+        usd_setattrib(0, @primpath, name, chp(value_name)); \n\
+    else if (type == "m33f") \n\
+        usd_setattrib(0, @primpath, name, ch3(value_name)); \n\
+    else if (type == "m44f") \n\
+        usd_setattrib(0, @primpath, name, ch4(value_name)); \n\
+} \n\n\
+usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
+)
+# Snippets for the user metadata and ShotGrid metadata wrangles
+METADATA_SNIPPETS = (
+    METADATA_SNIPPET.substitute(level="../"),
+    METADATA_SNIPPET.substitute(level=""),
+)
+# Parm template class per metadata value type
+METADATA_PARM_TEMPLATES = {
+    "float": hou.FloatParmTemplate,
+    "int": hou.IntParmTemplate,
+    "string": hou.StringParmTemplate,
+}
+# Upper case letters that start a new word in a camel cased string
+CAMEL_CASE_RE = re.compile(r"((?<=[a-z])[A-Z]|(?<!\A)[A-Z](?=[a-z]))")
+
+
+@functools.lru_cache(maxsize=None)
+def _pretty_name(text: str) -> str:
+    """
+    Convert a camel cased id to a title cased label, e.g. motionVector to
+    Motion Vector
+
+    Args:
+        text (str): Camel cased id
+
+    Returns:
+        str: Title cased label
+    """
+    return CAMEL_CASE_RE.sub(r" \1", text).title()
+
+
+def _prepare_output_files() -> dict[OutputIdentifier, tuple[tuple, ...]]:
+    """
+    Group the options of OUTPUT_FILES by their subfolder once at import
+
+    Returns:
+        dict: Per output file a subfolder id, note and options group, starting with the
+            options without a subfolder. Each option is its key, whether it's a separator
+            and its value.
+    """
+    prepared = {}
+    for output_id, output_file in OUTPUT_FILES.items():
+        notes = output_file.get("notes", {})
+        groups = {None: []}
+        for key, value in output_file["options"].items():
+            subfolder_id = key.split("_")[0] if "_" in key else None
+            groups.setdefault(subfolder_id, []).append(
+                (key, isinstance(value, str), value)
+            )
+
+        prepared[output_id] = tuple(
+            (subfolder_id, notes.get(subfolder_id), tuple(options))
+            for subfolder_id, options in groups.items()
+        )
+    return prepared
+
+
+OUTPUT_FILES_PREPARED = _prepare_output_files()
+
+RENDERER_NAMES = (
+    "HdPrmanLoaderRendererPlugin",
+    "HdPrmanXpuLoaderRendererPlugin",
+    "HdPrmanXpuCpuLoaderRendererPlugin",
+    "HdPrmanXpuGpuLoaderRendererPlugin",
+)
+RENDERER_LABELS = ("RIS", "XPU", "XPU - CPU", "XPU - GPU")
+DEFAULT_INTEGRATOR = "PxrPathTracer"
+# Conditionals of the referenced frame range parms
+ROP_TIME_CONDITIONALS = {
+    "f": (hou.parmCondType.DisableWhen, '{ trange == "off" }'),
+}
+LOP_TIME_CONDITIONALS = {
+    **ROP_TIME_CONDITIONALS,
+    "foffset": (hou.parmCondType.DisableWhen, '{ trange != "stage" }'),
+}
+
+# Sampling parms of the render node that aren't referenced on the HDA
+EXCLUDED_SAMPLING_LABELS = frozenset(("Sample Motion", "Frame Number"))
+# Buttons at the top of the HDA, identical for every OTL type
+RENDER_BUTTONS = (
+    hou.ButtonParmTemplate(
+        "executeFarm",
+        "Submit to Farm",
+        join_with_next=True,
+        script_callback="hou.phm().render(kwargs['node'], True)",
+        script_callback_language=hou.scriptLanguage.Python,
+    ),
+    hou.ButtonParmTemplate(
+        "executeLocal",
+        "Render to Disk",
+        join_with_next=True,
+        script_callback="hou.phm().render(kwargs['node'], False)",
+        script_callback_language=hou.scriptLanguage.Python,
+    ),
+    hou.ButtonParmTemplate(
+        "copyPathToClipboard",
+        "Copy path to clipboard",
+        join_with_next=True,
+        script_callback="hou.phm().copy_to_clipboard(kwargs['node'])",
+        script_callback_language=hou.scriptLanguage.Python,
+    ),
+    hou.ButtonParmTemplate(
+        "openStats",
+        "Open render statistics",
+        script_callback="hou.phm().open_stats(kwargs['node'])",
+        script_callback_language=hou.scriptLanguage.Python,
+    ),
+)
+
 PARM_MAPPING = {
     "ri_statistics_level": "xn__ristatisticslevel_n3ak",
     "ri_statistics_xmlfilename": "xn__ristatisticsxmlfilename_febk",
@@ -202,6 +390,79 @@ PARM_MAPPING = {
 }
 
 
+@functools.lru_cache(maxsize=None)
+def _read_file(path: pathlib.Path, binary: bool = False) -> Union[str, bytes]:
+    """
+    Read a file, cached as the sources don't change between builds
+
+    Args:
+        path (pathlib.Path): File path
+        binary (bool): Read the file as bytes instead of text
+
+    Returns:
+        Union[str, bytes]: File contents
+    """
+    return path.read_bytes() if binary else path.read_text()
+
+
+@functools.lru_cache(maxsize=2)
+def _discover_integrators(is_lop: bool) -> tuple[tuple[str, str], ...]:
+    """
+    Find the available RenderMan integrators, cached as they don't change between builds
+
+    Args:
+        is_lop (bool): Whether the integrators are used in the LOP context
+
+    Returns:
+        tuple[tuple[str, str], ...]: Name and label of each integrator
+    """
+    integrator_list = list()
+
+    for value in hou.vopNodeTypeCategory().nodeTypes().values():
+        # The full type name contains the core name, so it rules out most types
+        # before the name components are split
+        if "pxr" not in value.name():
+            continue
+        name = value.nameComponents()[2]
+        if "pxr" not in name or not value.hasSectionData("Tools.shelf"):
+            continue
+
+        # Most shelf tools aren't integrators, a plain substring test rules them
+        # out before the submenu is searched
+        shelf = value.sectionData("Tools.shelf")
+        if "Integrator" not in shelf:
+            continue
+
+        submenu = TOOL_SUBMENU_RE.search(shelf)
+        if submenu and "Integrator" in submenu.group(1):
+            description = value.description()
+            if not (is_lop and description == "PxrValidateBxdf"):
+                integrator_list.append(
+                    (
+                        description,
+                        CreateOtl._space_camel_case(description.replace("Pxr", "")),
+                    )
+                )
+
+    return tuple(integrator_list)
+
+
+@functools.lru_cache(maxsize=2)
+def _integrator_menu(is_lop: bool) -> tuple[tuple[str, ...], tuple[str, ...], int]:
+    """
+    Get the integrator menu items, cached alongside the discovered integrators
+
+    Args:
+        is_lop (bool): Whether the integrators are used in the LOP context
+
+    Returns:
+        tuple[tuple[str, ...], tuple[str, ...], int]: Menu names, menu labels and
+            the index of the default integrator
+    """
+    names, labels = zip(*_discover_integrators(is_lop))
+    return names, labels, names.index(DEFAULT_INTEGRATOR)
+
+
 class CreateOtl:
     def __init__(self, otl_type: OTLTypes):
         self._otl_type = otl_type
@@ -214,6 +475,59 @@ class CreateOtl:
         self._node_name = "sgtk_ris" if self._is_shotgrid else "RenderMan_Renderer"
         self._otl_name = "SGTK_RenderMan" if self._is_shotgrid else "RenderMan_Renderer"
 
+        self._ptg_cache: dict[int, hou.ParmTemplateGroup] = {}
+        self._flat_ptg_cache: dict[int, dict[str, hou.ParmTemplate]] = {}
+        self._pending_expressions: list[tuple[hou.Parm, str]] = []
+        self._pending_layout: list[tuple[hou.Node, tuple[hou.Node, ...]]] = []
+
+    def _ptg(self, node: hou.Node) -> hou.ParmTemplateGroup:
+        """Get the parm template group of a node, cached per node
+
+        Args:
+            node (hou.Node): Node to get the parm template group from
+        Returns:
+            hou.ParmTemplateGroup: Parm template group
+        """
+        key = node.sessionId()
+        ptg = self._ptg_cache.get(key)
+        if ptg is None:
+            ptg = node.parmTemplateGroup()
+            self._ptg_cache[key] = ptg
+        return ptg
+
+    def _flat_ptg(self, node: hou.Node) -> dict[str, hou.ParmTemplate]:
+        """Get all parm templates of a node by name, including items in folders,
+        cached per node
+
+        Args:
+            node (hou.Node): Node to get the parm templates from
+        Returns:
+            dict[str, hou.ParmTemplate]: Parm templates by name
+        """
+        key = node.sessionId()
+        flat_ptg = self._flat_ptg_cache.get(key)
+        if flat_ptg is None:
+            flat_ptg = {}
+            stack = deque(self._ptg(node).parmTemplates())
+            while stack:
+                parm = stack.popleft()
+                flat_ptg.setdefault(parm.name(), parm)
+                if parm.type() == hou.parmTemplateType.Folder:
+                    stack.extend(parm.parmTemplates())
+            self._flat_ptg_cache[key] = flat_ptg
+        return flat_ptg
+
+    def _set_ptg(self, node: hou.Node, ptg: hou.ParmTemplateGroup):
+        """Set the parm template group of a node, invalidating the cached one
+
+        Args:
+            node (hou.Node): Node to set the parm template group on
+            ptg (hou.ParmTemplateGroup): Parm template group
+        """
+        node.setParmTemplateGroup(ptg)
+        self._ptg_cache.pop(node.sessionId(), None)
+        self._flat_ptg_cache.pop(node.sessionId(), None)
+
     def _parm_name(self, sop_name: str) -> str:
         """Get the parameter name for the current context
 
@@ -222,10 +536,7 @@ class CreateOtl:
         Returns:
             str: Corrected name
         """
-        if self._is_lop:
-            if sop_name in PARM_MAPPING.keys():
-                return PARM_MAPPING[sop_name]
-        return sop_name
+        return PARM_MAPPING.get(sop_name, sop_name) if self._is_lop else sop_name
 
     def _link_parm(
         self,
@@ -245,35 +556,69 @@ class CreateOtl:
             prepend (str): String to prepend to source parameter key
             append (str): String to append to source parameter key
         """
-        dist_name = self._parm_name(parm_name)
-        org_parm = node.parmTemplateGroup().find(dist_name)
-        if not org_parm:
-            logging.error("parm not found: ", parm_name)
-            return
+        self._link_parms(node, (parm_name,), level, prepend, append)
+
+    def _link_parms(
+        self,
+        node: hou.Node,
+        parm_names: Iterable[str],
+        level: int = 1,
+        prepend: str = "",
+        append: str = "",
+    ):
+        """
+        Link multiple parameters from the source node to a destination node
+
+        Args:
+            node (hou.None): Node to add the expressions to
+            parm_names (Iterable[str]): Parameter keys on the source node
+            level (int): Levels between source and destination node
+            prepend (str): String to prepend to source parameter keys
+            append (str): String to append to source parameter keys
+        """
+        flat_ptg = self._flat_ptg(node)
+        node_parm = node.parm
+        queue = self._pending_expressions.append
 
         if self._is_lop and level != 1:
             level -= 1
+        up = "../" * level
+
+        for parm_name in parm_names:
+            dist_name = self._parm_name(parm_name)
+            org_parm = flat_ptg.get(dist_name)
+            if not org_parm:
+                logger.error("parm not found: %s", parm_name)
+                continue
+
+            parm_type = "ch"
+            if org_parm.dataType() == hou.parmData.String:
+                parm_type = "chsop"
+
+            source = f'{parm_type}("{up}{prepend}{parm_name}{append}'
+            num_components = org_parm.numComponents()
+            if num_components == 1:
+                queue((node_parm(dist_name), f'{source}")'))
+            else:
+                scheme = self._convert_naming_scheme(org_parm.namingScheme())
+                for suffix in scheme[:num_components]:
+                    queue((node_parm(dist_name + suffix), f'{source}{suffix}")'))
 
-        parm_type = "ch"
-        if org_parm.dataType() == hou.parmData.String:
-            parm_type = "chsop"
+    def _apply_expressions(self):
+        """
+        Set all expressions queued by _link_parms, once the HDA parameters exist
+        """
+        for parm, expression in self._pending_expressions:
+            parm.setExpression(expression)
+        self._pending_expressions.clear()
 
-        if org_parm.numComponents() == 1:
-            node.parm(dist_name).setExpression(
-                '{}("{}{}")'.format(
-                    parm_type, "../" * level, prepend + parm_name + append
-                )
-            )
-        else:
-            scheme = self._convert_naming_scheme(org_parm.namingScheme())
-            for i in range(org_parm.numComponents()):
-                node.parm(dist_name + scheme[i]).setExpression(
-                    '{}("{}{}")'.format(
-                        parm_type,
-                        "../" * level,
-                        prepend + parm_name + append + scheme[i],
-                    )
-                )
+    def _apply_layout(self):
+        """
+        Lay out all networks queued during build in a single pass
+        """
+        for network, items in self._pending_layout:
+            network.layoutChildren(items)
+        self._pending_layout.clear()
 
     def _link_deep_parms(
         self, node: hou.Node, parms: list[str], prepend: str = "", append: str = ""
@@ -287,11 +632,45 @@ class CreateOtl:
             prepend (str): String to prepend to source parameter key
             append (str): String to append to source parameter key
         """
-        for parm in parms:
+        names = []
+        stack = deque(parms)
+        while stack:
+            parm = stack.popleft()
             if parm.type() == hou.parmTemplateType.Folder:
-                self._link_deep_parms(node, parm.parmTemplates(), prepend, append)
+                stack.extend(parm.parmTemplates())
             else:
-                self._link_parm(node, parm.name(), 2, prepend, append)
+                names.append(parm.name())
+        self._link_parms(node, names, 2, prepend, append)
+
+    @staticmethod
+    def _modify_deep_parms(
+        parms: list[hou.ParmTemplate], modifier: Callable[[hou.ParmTemplate], None]
+    ) -> list[hou.ParmTemplate]:
+        """
+        Call a modifier on a list of parm templates, including items in folders
+
+        Args:
+            parms (list[hou.ParmTemplate]): List of ParmTemplates to modify
+            modifier (Callable[[hou.ParmTemplate], None]): The function which is called on every template
+
+        Returns:
+            list[hou.ParmTemplate]: Modified list of ParmTemplates
+        """
+        # Folders hold copies of their templates, so the modified contents are written
+        # back afterwards, from the deepest folder up
+        folders = []
+        stack = deque([parms])
+        while stack:
+            for parm in stack.popleft():
+                modifier(parm)
+                if parm.type() == hou.parmTemplateType.Folder:
+                    children = parm.parmTemplates()
+                    folders.append((parm, children))
+                    stack.append(children)
+
+        for folder, children in reversed(folders):
+            folder.setParmTemplates(children)
+        return parms
 
     def _set_deep_conditional(
         self,
@@ -300,60 +679,81 @@ class CreateOtl:
         modifier: Callable[[str], str],
     ):
         """
-        Modify the conditionals of a list of parm templates
+        Modify the conditionals of a list of parm templates, including folders and
+        their contents
 
         Args:
             parms (tuple[hou.ParmTemplate, ...]): List of ParmTemplates to modify
             cond_type (hou.parmCondType): The type of conditional to modify
             modifier (Callable[[str], str]): The function which is called on the source conditional
         """
-        for parm in parms:
-            if parm.type() == hou.parmTemplateType.Folder:
-                new_parms = self._set_deep_conditional(
-                    parm.parmTemplates(), cond_type, modifier
-                )
-                parm.setParmTemplates(new_parms)
-            elif cond_type in parm.conditionals():
-                parm.setConditional(cond_type, modifier(parm.conditionals()[cond_type]))
-        return parms
 
-    def _reference_parm(
+        def set_conditional(parm: hou.ParmTemplate):
+            conditional = parm.conditionals().get(cond_type)
+            if conditional is not None:
+                parm.setConditional(cond_type, modifier(conditional))
+
+        return self._modify_deep_parms(parms, set_conditional)
+
+    def _get_reference_parm(
         self,
         node: hou.Node,
-        dest: hou.ParmTemplateGroup,
         parm: str,
         conditional: list[hou.parmCondType, str] = None,
-    ):
+    ) -> Optional[hou.ParmTemplate]:
         """
-        Create a reference of a parameter to a template group
+        Get a parameter template to reference and link it to the source node. Without
+        a conditional the cached template is returned, clone it before modifying it.
 
         Args:
             node (hou.Node): The node to get the parameter from
-            dest (hou.ParmTemplateGroup): The ParmTemplateGroup to add the reference to
             parm (str): The parameter key
             conditional (list[hou.parmCondType, str]): An optional conditional
+
+        Returns:
+            Optional[hou.ParmTemplate]: The parameter template, None if not found
         """
-        org_parms = node.parmTemplateGroup()
-        org_parm = org_parms.find(parm)
+        org_parm = self._flat_ptg(node).get(parm)
         if not org_parm:
-            logging.error("Parm not found: ", parm)
-            return
+            logger.error("Parm not found: %s", parm)
+            return None
 
         if conditional:
+            # The cached template is shared, so the conditional is set on a copy
+            org_parm = org_parm.clone()
             org_parm.setConditional(conditional[0], conditional[1])
 
-        if hasattr(dest, "append"):
-            dest.append(org_parm)
-        elif hasattr(dest, "addParmTemplate"):
-            dest.addParmTemplate(org_parm)
-        else:
-            logging.error("Undefined method")
-            return
-
         self._link_parm(node, parm)
+        return org_parm
+
+    def _reference_parm(
+        self,
+        node: hou.Node,
+        add: Callable[[hou.ParmTemplate], None],
+        parm: str,
+        conditional: list[hou.parmCondType, str] = None,
+    ):
+        """
+        Create a reference of a parameter to a template group
+
+        Args:
+            node (hou.Node): The node to get the parameter from
+            add (Callable[[hou.ParmTemplate], None]): Bound add method of the
+                destination, e.g. ParmTemplateGroup.append or
+                FolderParmTemplate.addParmTemplate
+            parm (str): The parameter key
+            conditional (list[hou.parmCondType, str]): An optional conditional
+        """
+        org_parm = self._get_reference_parm(node, parm, conditional)
+        if org_parm:
+            add(org_parm)
 
     def _rename_deep_parms(
-        self, parms: list[hou.ParmTemplate], prepend: str = "", append: str = ""
+        self,
+        parms: list[hou.ParmTemplate],
+        prepend: str = "",
+        append: str = "",
+        link_node: hou.Node = None,
     ) -> list[hou.ParmTemplate]:
         """
         Prepend and/or append a string to a list of parameter templates
@@ -362,15 +762,24 @@ class CreateOtl:
             parms (list[hou.ParmTemplate]): List of ParmTemplates to modify
             prepend (str): String to prepend to the name
             append (str): String to append to the name
+            link_node (hou.Node): Optional node to link the parameters to in the same
+                walk, like _link_deep_parms does
 
         Returns:
             list[hou.ParmTemplate]: Modified list of ParmTemplates
         """
-        for parm in parms:
-            parm.setName(prepend + parm.name() + append)
-            if parm.type() == hou.parmTemplateType.Folder:
-                renamed = self._rename_deep_parms(parm.parmTemplates(), prepend, append)
-                parm.setParmTemplates(renamed)
+        # Source names of the templates to link, queued in bulk after the walk
+        link_names = []
+
+        def rename(parm: hou.ParmTemplate):
+            name = parm.name()
+            if link_node and parm.type() != hou.parmTemplateType.Folder:
+                link_names.append(name)
+            parm.setName(prepend + name + append)
+
+        self._modify_deep_parms(parms, rename)
+        if link_names:
+            self._link_parms(link_node, link_names, 2, prepend, append)
         return parms
 
     def _set_parm(self, node: hou.Node, parm_name: str, value: any):
@@ -404,29 +813,29 @@ class CreateOtl:
             folder (hou.FolderParmTemplate): Folder to add the custom AOV block to
         """
         name = folder.label().replace(" ", "")
+        lower_name = name.lower()
+        prefix = f"aov{name}Custom"
 
-        disable = "{{aov{}CustomDisable_# == 1}}".format(name)
+        disable = f"{{{prefix}Disable_# == 1}}"
         custom_folder = hou.FolderParmTemplate(
-            "{}Custom".format(name.lower()),
+            f"{lower_name}Custom",
             "Custom AOVs",
             folder_type=hou.folderType.Collapsible,
         )
         custom = hou.FolderParmTemplate(
-            "{}CustomAOVs".format(name.lower()),
+            f"{lower_name}CustomAOVs",
             "Extra Image Planes",
             folder_type=hou.folderType.MultiparmBlock,
         )
         custom.addParmTemplate(
-            hou.ToggleParmTemplate("aov{}CustomDisable_#".format(name), "Disable AOV")
+            hou.ToggleParmTemplate(f"{prefix}Disable_#", "Disable AOV")
         )
         custom.addParmTemplate(
-            hou.StringParmTemplate(
-                "aov{}CustomName_#".format(name), "Name", 1, disable_when=disable
-            )
+            hou.StringParmTemplate(f"{prefix}Name_#", "Name", 1, disable_when=disable)
         )
         custom.addParmTemplate(
             hou.MenuParmTemplate(
-                "aov{}CustomSource_#".format(name),
+                f"{prefix}Source_#",
                 "Source",
                 ("color", "float", "integer", "vector", "normal", "point"),
                 ("Color", "Float", "Integer", "Vector", "Normal", "Point"),
@@ -436,7 +845,7 @@ class CreateOtl:
         )
         custom.addParmTemplate(
             hou.StringParmTemplate(
-                "aov{}CustomLPE_#".format(name),
+                f"{prefix}LPE_#",
                 "LPE",
                 1,
                 is_label_hidden=True,
@@ -447,6 +856,99 @@ class CreateOtl:
         custom_folder.addParmTemplate(custom)
         folder.addParmTemplate(custom_folder)
 
+    def _add_light_groups(self, folder: hou.FolderParmTemplate):
+        """
+        Add the light groups multiparm block
+
+        Args:
+            folder (hou.FolderParmTemplate): Folder to add the light groups to
+        """
+        light_groups = hou.FolderParmTemplate(
+            "light_groups",
+            "Light Groups",
+            folder_type=hou.folderType.Simple,
+        )
+
+        light_groups.addParmTemplate(
+            hou.ButtonParmTemplate(
+                "setup_light_groups",
+                "Update light groups",
+                script_callback="hou.phm().setup_light_groups(kwargs['node'])",
+                script_callback_language=hou.scriptLanguage.Python,
+            )
+        )
+
+        light_group_item = hou.FolderParmTemplate(
+            "light_groups_select",
+            "Light Groups",
+            folder_type=hou.folderType.MultiparmBlock,
+        )
+        light_group_name = hou.StringParmTemplate(
+            "light_group_name_#",
+            "Name",
+            1,
+            string_type=hou.stringParmType.Regular,
+            naming_scheme=hou.parmNamingScheme.Base1,
+        )
+
+        light_operator_list = hou.StringParmTemplate(
+            "select_light_ops_#",
+            f"Select Light {'L' if self._is_lop else ''}OPs",
+            1,
+            string_type=hou.stringParmType.NodeReferenceList,
+            naming_scheme=hou.parmNamingScheme.Base1,
+            tags={
+                "opfilter": f"!!{'LOP' if self._is_lop else 'OBJ/LIGHT'}!!",
+                "oprelative": ".",
+            },
+        )
+
+        light_group_item.addParmTemplate(light_group_name)
+        light_group_item.addParmTemplate(light_operator_list)
+        light_group_item.addParmTemplate(hou.SeparatorParmTemplate("lgSep#"))
+
+        light_groups.addParmTemplate(light_group_item)
+        folder.addParmTemplate(light_groups)
+
+    @staticmethod
+    def _add_tees(folder: hou.FolderParmTemplate):
+        """
+        Add the shading AOVs (tee) multiparm block
+
+        Args:
+            folder (hou.FolderParmTemplate): Folder to add the tees to
+        """
+        folder.addParmTemplate(hou.SeparatorParmTemplate("sep5"))
+        aovs_tee = hou.FolderParmTemplate(
+            "tees",
+            "Shading AOVs (Tee)",
+            folder_type=hou.folderType.MultiparmBlock,
+        )
+        aovs_tee.addParmTemplate(
+            hou.MenuParmTemplate(
+                "teeType_#",
+                "",
+                ("color", "float", "integer", "vector", "normal", "point"),
+                ("Color", "Float", "Integer", "Vector", "Normal", "Point"),
+                join_with_next=True,
+                is_label_hidden=True,
+            )
+        )
+        aovs_tee.addParmTemplate(hou.StringParmTemplate("teeName_#", "    Name", 1))
+        folder.addParmTemplate(aovs_tee)
+        tee_msg = hou.LabelParmTemplate(
+            "teeInfo",
+            "Info",
+            column_labels=(
+                "Use a PxrTee node in your shader to export a specific shading step.\n"
+                "If you want to export something that isn't directly put into the shader, input the tee node "
+                "into the userColor input.\n"
+                "Use the PxrArithmetic node to combine multiple Tee nodes for export.",
+            ),
+        )
+        tee_msg.setLabelParmType(hou.labelParmType.Message)
+        folder.addParmTemplate(tee_msg)
+
     @staticmethod
     def _get_metadata_block():
         """
@@ -462,43 +964,19 @@ class CreateOtl:
             hou.StringParmTemplate("metadata_#_key", "Key", 1, join_with_next=True)
         )
 
-        metadata_types = [
-            {"key": "float", "name": "Float", "type": "float", "components": 1},
-            {"key": "int", "name": "Integer", "type": "int", "components": 1},
-            {"key": "string", "name": "String", "type": "string", "components": 1},
-            {"key": "v2f", "name": "Vector 2 Float", "type": "float", "components": 2},
-            {"key": "v2i", "name": "Vector 2 Int", "type": "int", "components": 2},
-            {"key": "v3f", "name": "Vector 3 Float", "type": "float", "components": 3},
-            {"key": "v3i", "name": "Vector 3 Int", "type": "int", "components": 3},
-            {"key": "box2f", "name": "Box 2 Float", "type": "float", "components": 4},
-            {"key": "box2i", "name": "Box 2 Int", "type": "int", "components": 4},
-            {"key": "m33f", "name": "Matrix 3x3", "type": "float", "components": 9},
-            {"key": "m44f", "name": "Matrix 4x4", "type": "float", "components": 16},
-        ]
-        metadata_names = [md_type["key"] for md_type in metadata_types]
-        metadata_labels = [md_type["name"] for md_type in metadata_types]
-
         metadata_entries.addParmTemplate(
             hou.MenuParmTemplate(
-                "metadata_#_type", "   Type", metadata_names, metadata_labels
+                "metadata_#_type", "   Type", METADATA_NAMES, METADATA_LABELS
             )
         )
 
-        for md_type in metadata_types:
-            if md_type["type"] == "float":
-                parm = hou.FloatParmTemplate(
-                    f"metadata_#_{md_type['key']}", "Value", md_type["components"]
-                )
-            elif md_type["type"] == "int":
-                parm = hou.IntParmTemplate(
-                    f"metadata_#_{md_type['key']}", "Value", md_type["components"]
-                )
-            elif md_type["type"] == "string":
-                parm = hou.StringParmTemplate(
-                    f"metadata_#_{md_type['key']}", "Value", md_type["components"]
-                )
+        for md_type in METADATA_TYPES:
+            key = md_type["key"]
+            parm = METADATA_PARM_TEMPLATES[md_type["type"]](
+                f"metadata_#_{key}", "Value", md_type["components"]
+            )
             parm.setConditional(
-                hou.parmCondType.HideWhen, f"{{ metadata_#_type != {md_type['key']} }}"
+                hou.parmCondType.HideWhen, f"{{ metadata_#_type != {key} }}"
             )
             metadata_entries.addParmTemplate(parm)
 
@@ -514,47 +992,36 @@ class CreateOtl:
             output_id (OutputIdentifier): Output identifier
             folder (hou.FolderParmTemplate): Folder to add the toggles to
         """
-        output_file = OUTPUT_FILES[output_id]
-        subfolders = {}
+        for subfolder_id, note, options in OUTPUT_FILES_PREPARED[output_id]:
+            if subfolder_id is None:
+                add_folder = folder
+            else:
+                add_folder = hou.FolderParmTemplate(
+                    subfolder_id,
+                    _pretty_name(subfolder_id),
+                    folder_type=hou.folderType.Simple,
+                )
 
-        for key, value in output_file["options"].items():
-            add_folder = folder
-            if "_" in key:
-                subfolder_id = key.split("_")[0]
-                if subfolder_id not in subfolders:
-                    subfolder_name = string.capwords(
-                        self._space_camel_case(subfolder_id)
-                    )
-                    add_folder = hou.FolderParmTemplate(
-                        subfolder_id,
-                        subfolder_name,
-                        folder_type=hou.folderType.Simple,
+                # Add folder note
+                if note:
+                    note_parm = hou.LabelParmTemplate(
+                        f"{subfolder_id}Note", "Note", column_labels=(note,)
                     )
+                    note_parm.setLabelParmType(hou.labelParmType.Message)
+                    add_folder.addParmTemplate(note_parm)
 
-                    # Add folder note
-                    if "notes" in output_file and subfolder_id in output_file["notes"]:
-                        note = hou.LabelParmTemplate(
-                            f"{subfolder_id}Note",
-                            "Note",
-                            column_labels=(output_file["notes"][subfolder_id],),
-                        )
-                        note.setLabelParmType(hou.labelParmType.Message)
-                        add_folder.addParmTemplate(note)
-
-                    subfolders[subfolder_id] = add_folder
+            for key, is_separator, value in options:
+                if is_separator:
+                    add_folder.addParmTemplate(hou.SeparatorParmTemplate(f"aov{key}"))
                 else:
-                    add_folder = subfolders[subfolder_id]
-
-            if type(value) is str:
-                add_folder.addParmTemplate(hou.SeparatorParmTemplate(f"aov{key}"))
-            else:
-                toggle = hou.ToggleParmTemplate(key, value["name"])
-                if "default" in value:
-                    toggle.setDefaultValue(value["default"])
-                add_folder.addParmTemplate(toggle)
+                    toggle = hou.ToggleParmTemplate(key, value["name"])
+                    if "default" in value:
+                        toggle.setDefaultValue(value["default"])
+                    add_folder.addParmTemplate(toggle)
 
-        for subfolder in subfolders.values():
-            folder.addParmTemplate(subfolder)
+            # Subfolders are added once complete, as the folder stores a copy
+            if add_folder is not folder:
+                folder.addParmTemplate(add_folder)
 
     @staticmethod
     def _convert_naming_scheme(naming_scheme: hou.parmNamingScheme) -> tuple[str, ...]:
@@ -567,24 +1034,7 @@ class CreateOtl:
         Returns:
            tuple[str, ...]: Suffixes for the components
         """
-        if naming_scheme == hou.parmNamingScheme.Base1:
-            return "1", "2", "3", "4"
-        elif naming_scheme == hou.parmNamingScheme.XYZW:
-            return "x", "y", "z", "w"
-        elif naming_scheme == hou.parmNamingScheme.XYWH:
-            return "x", "y", "w", "h"
-        elif naming_scheme == hou.parmNamingScheme.UVW:
-            return "u", "v", "w"
-        elif naming_scheme == hou.parmNamingScheme.RGBA:
-            return "r", "g", "b", "a"
-        elif naming_scheme == hou.parmNamingScheme.MinMax:
-            return "min", "max"
-        elif naming_scheme == hou.parmNamingScheme.MaxMin:
-            return "max", "min"
-        elif naming_scheme == hou.parmNamingScheme.StartEnd:
-            return "start", "end"
-        elif naming_scheme == hou.parmNamingScheme.BeginEnd:
-            return "begin", "end"
+        return NAMING_SCHEMES.get(naming_scheme)
 
     @staticmethod
     def _space_camel_case(text: str) -> str:
@@ -597,37 +1047,36 @@ class CreateOtl:
         Returns:
             str: Spaced string
         """
-        return re.sub(r"((?<=[a-z])[A-Z]|(?<!\A)[A-Z](?=[a-z]))", r" \1", text)
+        return CAMEL_CASE_RE.sub(r" \1", text)
 
     def build(self):
         """
         Build the HDA
+
+        Undo recording and automatic cooking are suspended while building, the
+        update mode is restored afterward.
+        """
+        update_mode = hou.updateModeSetting()
+        hou.setUpdateMode(hou.updateMode.Manual)
+        try:
+            with hou.undos.disabler():
+                self._build()
+        finally:
+            hou.setUpdateMode(update_mode)
+
+    def _build(self):
         """
-        logging.debug("Creating nodes")
+        Create the nodes, parameters and HDA definition
+        """
+        logger.debug("Creating nodes")
         hda = hou.node(f"/{self._context_name}/{self._otl_name}")
         if hda:
             hda.destroy()
 
         hda = hou.node(f"/{self._context_name}/").createNode("subnet", self._otl_name)
 
-        integrator_list = list()
-
         # Find available integrators and add them
-        for key, value in hou.vopNodeTypeCategory().nodeTypes().items():
-            name = value.nameComponents()[2]
-            if "pxr" in name and value.hasSectionData("Tools.shelf"):
-                if "Integrator" in ET.fromstring(value.sectionData("Tools.shelf")).find(
-                    "tool"
-                ).findtext("toolSubmenu"):
-                    if not (self._is_lop and value.description() == "PxrValidateBxdf"):
-                        integrator_list.append(
-                            (
-                                value.description(),
-                                self._space_camel_case(
-                                    value.description().replace("Pxr", "")
-                                ),
-                            )
-                        )
+        integrator_list = _discover_integrators(self._is_lop)
 
         #
         # Create nodes
@@ -659,28 +1108,8 @@ class CreateOtl:
             hda.subnetOutputs()[0].setInput(0, node_set_cam_resolution)
 
             # Output Files config
-            node_output_files.parm("camera").setExpression(
-                'chs("../render_settings/camera")'
-            )
-            node_output_files.parm("resolution1").setExpression(
-                'ch("../render_settings/resolutionx")'
-            )
-            node_output_files.parm("resolution2").setExpression(
-                'ch("../render_settings/resolutiony")'
-            )
-            node_output_files.parm("instantaneousShutter").setExpression(
-                'ch("../render_settings/instantaneousShutter")'
-            )
-            node_output_files.parm("aspectRatioConformPolicy").setExpression(
-                'chs("../render_settings/aspectRatioConformPolicy")'
-            )
-            for i in range(1, 4):
-                node_output_files.parm(f"dataWindowNDC{i}").setExpression(
-                    f'ch("../render_settings/dataWindowNDC{i}")'
-                )
-            node_output_files.parm("pixelAspectRatio").setExpression(
-                'ch("../render_settings/pixelAspectRatio")'
-            )
+            for parm_name, expression in OUTPUT_FILES_EXPRESSIONS:
+                node_output_files.parm(parm_name).setExpression(expression)
             node_output_files.parm("products").set(0)
 
             # Render Settings config
@@ -691,40 +1120,15 @@ class CreateOtl:
             for i, node in enumerate([node_user_metadata, node_sg_metadata]):
                 node.parm("primpattern").set("/Render/** & %type:RenderProduct")
 
-                if i == 0:
-                    level = "../"
-                else:
-                    level = ""
+                if i == 1:
                     metadata_params = node_sg_metadata.parmTemplateGroup()
                     metadata_params.addParmTemplate(self._get_metadata_block())
                     metadata_params.addParmTemplate(
                         hou.StringParmTemplate("artist", "Artist", 1)
                     )
-                    node_sg_metadata.setParmTemplateGroup(metadata_params)
+                    self._set_ptg(node_sg_metadata, metadata_params)
 
-                node.parm("snippet").set(
-                    f'for (int i = 1; i <= chi("{level}metadata_entries"); i++) {{ \n\
-    string type = chs(sprintf("{level}metadata_%g_type", i)); \n\
-    string name = "driver:parameters:OpenEXR:" + chs(sprintf("{level}metadata_%g_key", i)); \n\
-    string value_name = sprintf("{level}metadata_%g_%s", i, type); \n\
-            \n\
-    if (type == "float") \n\
-        usd_setattrib(0, @primpath, name, chf(value_name)); \n\
-    else if (type == "int") \n\
-        usd_setattrib(0, @primpath, name, chi(value_name)); \n\
-    else if (type == "string") \n\
-        usd_setattrib(0, @primpath, name, chs(value_name)); \n\
-    else if (startswith(type, "v")) \n\
-        usd_setattrib(0, @primpath, name, chv(value_name)); \n\
-    else if (startswith(type, "bix")) \n\
-        usd_setattrib(0, @primpath, name, chp(value_name)); \n\
-    else if (type == "m33f") \n\
-        usd_setattrib(0, @primpath, name, ch3(value_name)); \n\
-    else if (type == "m44f") \n\
-        usd_setattrib(0, @primpath, name, ch4(value_name)); \n\
-}} \n\n\
-usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
-                )
+                node.parm("snippet").set(METADATA_SNIPPETS[i])
 
             # Set Cam Resolution
             node_set_cam_resolution.parm("primpattern").set(
@@ -751,7 +1155,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
                 node_sg_metadata,
             ]
 
-            hda.layoutChildren()
+            self._pending_layout.append((hda, ()))
         else:
             rman = hda.createNode("ris", "render")
             denoise = hda.createNode("denoise", "denoise")
@@ -761,7 +1165,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
             for integrator in integrator_list:
                 integrators.createNode(integrator[0].lower(), integrator[0])
 
-            integrators.layoutChildren()
+            self._pending_layout.append((integrators, ()))
 
             # AOV filters
             aovs = hda.createNode("matnet", "aovs")
@@ -773,7 +1177,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
             cpath = aovs.createNode("pxrcryptomatte", "CryptoPath")
             cpath.parm("layer").set("identifier:name")
 
-            aovs.layoutChildren()
+            self._pending_layout.append((aovs, ()))
 
             # Style nodes
             integrators.setColor(hou.Color(0, 0, 0))
@@ -784,8 +1188,9 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
 
             editable_nodes = [rman, denoise, aovs]
 
-            hda.layoutChildren((rman, denoise, aovs, integrators))
+            self._pending_layout.append((hda, (rman, denoise, aovs, integrators)))
 
+        self._apply_layout()
         hda.setSelected(True)
 
         #
@@ -800,11 +1205,11 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
         #
         # Create HDA
         #
-        logging.debug("Creating HDA")
+        logger.debug("Creating HDA")
         hda = hou.Node.createDigitalAsset(
             hda,
             self._node_name,
-            rf"D:\Developer\Pipeline\tk-houdini-renderman\otls\{self._context_type}_{self._node_name}.otl",
+            str(OTLS_DIR / f"{self._context_type}_{self._node_name}.otl"),
             version="25.2",
             ignore_external_references=True,
             create_backup=False,
@@ -819,10 +1224,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
         hda_options = hda_def.options()
 
         # TODO add non-ShotGrid version of PythonModule
-        python_module = open(
-            r"D:\Developer\Pipeline\tk-houdini-renderman\otls\PythonModule.py", "r"
-        )
-        hda_def.addSection("PythonModule", python_module.read())
+        hda_def.addSection("PythonModule", _read_file(PYTHON_MODULE_FILE))
         hda_def.setExtraFileOption("PythonModule/IsPython", True)
 
         on_created = 'kwargs["node"].setColor(hou.Color(0, 0.2, 0.3))'
@@ -832,69 +1234,36 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
         hda_def.addSection("OnCreated", on_created)
         hda_def.setExtraFileOption("OnCreated/IsPython", True)
 
-        editable_nodes = " ".join([node.name() for node in editable_nodes])
+        editable_nodes = " ".join(node.name() for node in editable_nodes)
         hda_def.addSection("EditableNodes", editable_nodes)
 
         # HDA Icon
-        image_file = r"D:\Developer\Pipeline\tk-houdini-renderman\images\rman_logo.svg"
         icon_section_name = "IconSVG"
 
-        with open(image_file, "rb") as open_file:
-            icon_data = open_file.read()
-
-        hda_def.addSection(icon_section_name, icon_data)
-        hda_def.setIcon(
-            "opdef:{}?{}".format(hda.type().nameWithCategory(), icon_section_name)
-        )
+        hda_def.addSection(icon_section_name, _read_file(ICON_FILE, binary=True))
+        hda_def.setIcon(f"opdef:{hda.type().nameWithCategory()}?{icon_section_name}")
 
         #
         # Populate nodes
         #
-        logging.debug("Adding render params")
+        logger.debug("Adding render params")
 
         # HDA
         hda_parms = hda_def.parmTemplateGroup()
-        rman_parms = rman.parmTemplateGroup()
+        # Folders of the render node by label, findFolder re-scans the group on
+        # every call
+        rman_folders: dict[str, hou.FolderParmTemplate] = {}
+        for parm in self._flat_ptg(rman).values():
+            if parm.type() == hou.parmTemplateType.Folder:
+                rman_folders.setdefault(parm.label(), parm)
 
         if not self._is_lop:
-            hda_parms.hide(hda_parms.find("execute"), True)
-            hda_parms.hide(hda_parms.find("renderdialog"), True)
+            hda_parms.hide("execute", True)
+            hda_parms.hide("renderdialog", True)
 
-        hda_parms.append(
-            hou.ButtonParmTemplate(
-                "executeFarm",
-                "Submit to Farm",
-                join_with_next=True,
-                script_callback="hou.phm().render(kwargs['node'], True)",
-                script_callback_language=hou.scriptLanguage.Python,
-            )
-        )
-        hda_parms.append(
-            hou.ButtonParmTemplate(
-                "executeLocal",
-                "Render to Disk",
-                join_with_next=True,
-                script_callback="hou.phm().render(kwargs['node'], False)",
-                script_callback_language=hou.scriptLanguage.Python,
-            )
-        )
-        hda_parms.append(
-            hou.ButtonParmTemplate(
-                "copyPathToClipboard",
-                "Copy path to clipboard",
-                join_with_next=True,
-                script_callback="hou.phm().copy_to_clipboard(kwargs['node'])",
-                script_callback_language=hou.scriptLanguage.Python,
-            )
-        )
-        hda_parms.append(
-            hou.ButtonParmTemplate(
-                "openStats",
-                "Open render statistics",
-                script_callback="hou.phm().open_stats(kwargs['node'])",
-                script_callback_language=hou.scriptLanguage.Python,
-            )
-        )
+        # The group stores copies, so the shared templates can be appended as is
+        for button in RENDER_BUTTONS:
+            hda_parms.append(button)
 
         hda_parms.append(
             hou.StringParmTemplate("name", "Name", 1, default_value=("main",))
@@ -917,35 +1286,31 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
 
         hda_parms.append(hou.SeparatorParmTemplate("sep1"))
 
+        add_hda_parm = hda_parms.append
         if self._is_lop:
             for p in (
                 "trange",
                 "f",
                 "foffset",
             ):
-                conditional = None
-                if p == "f":
-                    conditional = (hou.parmCondType.DisableWhen, '{ trange == "off" }')
-                if p == "foffset":
-                    conditional = (
-                        hou.parmCondType.DisableWhen,
-                        '{ trange != "stage" }',
-                    )
-                self._reference_parm(node_render, hda_parms, p, conditional)
+                self._reference_parm(
+                    node_render, add_hda_parm, p, LOP_TIME_CONDITIONALS.get(p)
+                )
 
             for p in ("camera", "resolution", "resolutionMenu", "instantaneousShutter"):
-                self._reference_parm(rman, hda_parms, p)
+                self._reference_parm(rman, add_hda_parm, p)
 
             # Aspect Ratio Folder
             aspect_ratio = hou.FolderParmTemplate(
                 "aspect_ratio", "Aspect Ratio", folder_type=hou.folderType.Collapsible
             )
+            add_aspect_ratio = aspect_ratio.addParmTemplate
             for p in (
                 "aspectRatioConformPolicy",
                 "dataWindowNDC",
                 "pixelAspectRatio",
             ):
-                self._reference_parm(rman, aspect_ratio, p)
+                self._reference_parm(rman, add_aspect_ratio, p)
             hda_parms.append(aspect_ratio)
         else:
             for p in (
@@ -958,35 +1323,28 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
                 "res_overrideMenu",
                 "aspect_override",
             ):
-                conditional = None
-                if p == "f":
-                    conditional = (hou.parmCondType.DisableWhen, '{ trange == "off" }')
-                self._reference_parm(rman, hda_parms, p, conditional)
+                self._reference_parm(
+                    rman, add_hda_parm, p, ROP_TIME_CONDITIONALS.get(p)
+                )
 
         # Rendering
-        logging.debug("Adding rendering settings")
+        logger.debug("Adding rendering settings")
         rendering = hou.FolderParmTemplate("rendering", "Rendering")
+        add_rendering = rendering.addParmTemplate
 
         if self._is_lop:
-            renderer_names = (
-                "HdPrmanLoaderRendererPlugin",
-                "HdPrmanXpuLoaderRendererPlugin",
-                "HdPrmanXpuCpuLoaderRendererPlugin",
-                "HdPrmanXpuGpuLoaderRendererPlugin",
-            )
-            renderer_labels = ("RIS", "XPU", "XPU - CPU", "XPU - GPU")
             rendering.addParmTemplate(
                 hou.MenuParmTemplate(
                     "renderer_variant",
                     "Renderer",
-                    renderer_names,
-                    renderer_labels,
+                    RENDERER_NAMES,
+                    RENDERER_LABELS,
                     default_value=0,
                 )
             )
             node_render.parm("renderer").setExpression('chs("../renderer_variant")')
         else:
-            self._reference_parm(rman, rendering, "renderer_variant")
+            self._reference_parm(rman, add_rendering, "renderer_variant")
 
         rendering.addParmTemplate(hou.SeparatorParmTemplate("sep2"))
 
@@ -1012,17 +1370,20 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
                 "geo_motionsamples",
                 "shutteroffset",
             ):
-                self._reference_parm(rman, rendering, p)
+                org_parm = self._get_reference_parm(rman, p)
+                if not org_parm:
+                    continue
+
+                # Adjusted before adding, the folder stores a copy
                 if p == "ri_hider_samplemotion":
-                    tmp = rendering.parmTemplates()
-                    tmp[-1].setMenuLabels(
+                    org_parm = org_parm.clone()
+                    org_parm.setMenuLabels(
                         ("2D Motion Blur (Motion Vectors)", "3D Motion Blur (Render)")
                     )
-                    rendering.setParmTemplates(tmp)
-                if p == "geo_motionsamples":
-                    tmp = rendering.parmTemplates()
-                    tmp[-1].setDefaultValue((2,))
-                    rendering.setParmTemplates(tmp)
+                elif p == "geo_motionsamples":
+                    org_parm = org_parm.clone()
+                    org_parm.setDefaultValue((2,))
+                add_rendering(org_parm)
 
             raydepth = hou.FolderParmTemplate(
                 "raydepth2",
@@ -1031,107 +1392,102 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
             )
 
             for p in ("maxdiffusedepth", "maxspeculardepth"):
-                self._reference_parm(rman, raydepth, p)
+                self._reference_parm(rman, raydepth.addParmTemplate, p)
 
             rendering.addParmTemplate(raydepth)
 
-        for parm in rman_parms.findFolder("Rendering").parmTemplates():
-            if parm.label() == "Sampling":
+        for parm in rman_folders["Rendering"].parmTemplates():
+            label = parm.label()
+            if label == "Sampling":
                 tab = hou.FolderParmTemplate(
                     parm.name(),
-                    parm.label(),
+                    label,
                 )
+                tab_parms = []
                 for p in parm.parmTemplates():
-                    if p.label() not in ["Sample Motion", "Frame Number"]:
+                    if p.label() not in EXCLUDED_SAMPLING_LABELS:
                         p.setConditional(hou.parmCondType.HideWhen, "")
-                        tab.addParmTemplate(p)
-                        self._link_parm(rman, p.name())
+                        tab_parms.append(p)
+                tab.setParmTemplates(tab_parms)
+                self._link_parms(rman, (p.name() for p in tab_parms))
 
                 rendering.addParmTemplate(tab)
 
-            elif parm.label() == "Render":
+            elif label == "Render":
                 for p in parm.parmTemplates():
                     if p.label() == "Limits":
                         p.setLabel("Render Limits")
                         p.setFolderType(hou.folderType.Tabs)
                         rendering.addParmTemplate(p)
-                        for pa in p.parmTemplates():
-                            self._link_parm(rman, pa.name())
+                        self._link_parms(rman, (pa.name() for pa in p.parmTemplates()))
 
-            elif self._is_lop and parm.label() == "Integrator":
+            elif self._is_lop and label == "Integrator":
                 integrator_params: tuple[hou.ParmTemplate, ...] = parm.parmTemplates()
 
         # Add integrators
-        logging.debug("Adding integrator settings")
+        logger.debug("Adding integrator settings")
         integrator_folder = hou.FolderParmTemplate("integrator_folder", "Integrator")
 
-        it_names = [md_type[0] for md_type in integrator_list]
-        it_labels = [md_type[1] for md_type in integrator_list]
+        it_names, it_labels, it_default = _integrator_menu(self._is_lop)
 
-        integrator_folder.addParmTemplate(
+        # Collected first and set on the folder at once, as every
+        # addParmTemplate copies the template into the folder
+        integrator_parms = [
             hou.MenuParmTemplate(
                 "integrator",
                 "Integrator",
-                tuple(it_names),
-                tuple(it_labels),
-                default_value=it_names.index("PxrPathTracer"),
+                it_names,
+                it_labels,
+                default_value=it_default,
             )
-        )
+        ]
         if self._is_lop:
             self._link_parm(rman, "integrator", 2)
 
             if integrator_params:
-                parameters = []
-                for parm in integrator_params:
-                    if parm.name() == PARM_MAPPING["integrator"]:
-                        continue
-                    parameters.append(parm)
+                integrator_key = PARM_MAPPING["integrator"]
+                parameters = [
+                    parm for parm in integrator_params if parm.name() != integrator_key
+                ]
 
                 self._link_deep_parms(rman, parameters)
                 self._set_deep_conditional(
                     parameters,
                     hou.parmCondType.HideWhen,
                     lambda conditional: conditional.replace(
-                        PARM_MAPPING["integrator"], "integrator"
+                        integrator_key, "integrator"
                     ),
                 )
 
-                for parm in parameters:
-                    if hou.parmCondType.HideWhen in parm.conditionals():
-                        hide_when = parm.conditionals()[
-                            hou.parmCondType.HideWhen
-                        ].replace(PARM_MAPPING["integrator"], "integrator")
-                        parm.setConditional(hou.parmCondType.HideWhen, hide_when)
-                    integrator_folder.addParmTemplate(parm)
+                integrator_parms.extend(parameters)
             else:
-                logging.debug("Integrator parameters couldn't be found!")
+                logger.debug("Integrator parameters couldn't be found!")
                 return
         else:
             rman.parm("shop_integratorpath").setExpression(
-                '"../{}/" + chs("../integrator")'.format(integrators.name())
+                f'"../{integrators.name()}/" + chs("../integrator")'
             )
 
             for name, label in integrator_list:
                 node = integrators.node(name)
-                temp = node.parmTemplateGroup().parmTemplates()
+                temp = self._ptg(node).parmTemplates()
                 prefix = f"{name}_"
+                hide_when = f"{{ integrator != {name} }}"
 
-                self._link_deep_parms(node, temp, prefix)
-                self._rename_deep_parms(temp, prefix)
+                self._rename_deep_parms(temp, prefix, link_node=node)
 
                 for parm in temp:
-                    parm.setConditional(
-                        hou.parmCondType.HideWhen, "{{ integrator != {} }}".format(name)
-                    )
-                    integrator_folder.addParmTemplate(parm)
+                    parm.setConditional(hou.parmCondType.HideWhen, hide_when)
+                integrator_parms.extend(temp)
 
+        integrator_folder.setParmTemplates(integrator_parms)
         rendering.addParmTemplate(integrator_folder)
 
         hda_parms.append(rendering)
         # End Rendering
 
         # AOVs
-        logging.debug("Adding AOV settings")
+        logger.debug("Adding AOV settings")
         aovs_folder = hou.FolderParmTemplate("aovs", "AOVs")
 
         aovs_folder.addParmTemplate(
@@ -1149,7 +1505,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
         else:
             self._reference_parm(
                 denoise,
-                aovs_folder,
+                aovs_folder.addParmTemplate,
                 "mode",
                 (hou.parmCondType.HideWhen, "{ denoise == 0 }"),
             )
@@ -1157,6 +1513,11 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
         self._add_output_file(OutputIdentifier.BEAUTY, aovs_folder)
         self._add_output_file(OutputIdentifier.DEEP, aovs_folder)
 
+        # Extra blocks of specific output files
+        extra_builders: dict[OutputIdentifier, Callable] = {
+            OutputIdentifier.LIGHTING: self._add_light_groups,
+            OutputIdentifier.UTILITY: self._add_tees,
+        }
         for file in (
             OutputIdentifier.SHADING,
             OutputIdentifier.LIGHTING,
@@ -1167,87 +1528,9 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
 
             self._add_output_file(file, folder)
 
-            if file == OutputIdentifier.LIGHTING:
-                light_groups = hou.FolderParmTemplate(
-                    "light_groups",
-                    "Light Groups",
-                    folder_type=hou.folderType.Simple,
-                )
-
-                light_groups.addParmTemplate(
-                    hou.ButtonParmTemplate(
-                        "setup_light_groups",
-                        "Update light groups",
-                        script_callback="hou.phm().setup_light_groups(kwargs['node'])",
-                        script_callback_language=hou.scriptLanguage.Python,
-                    )
-                )
-
-                light_group_item = hou.FolderParmTemplate(
-                    "light_groups_select",
-                    "Light Groups",
-                    folder_type=hou.folderType.MultiparmBlock,
-                )
-                light_group_name = hou.StringParmTemplate(
-                    "light_group_name_#",
-                    "Name",
-                    1,
-                    string_type=hou.stringParmType.Regular,
-                    naming_scheme=hou.parmNamingScheme.Base1,
-                )
-
-                light_operator_list = hou.StringParmTemplate(
-                    "select_light_ops_#",
-                    f"Select Light {'L' if self._is_lop else ''}OPs",
-                    1,
-                    string_type=hou.stringParmType.NodeReferenceList,
-                    naming_scheme=hou.parmNamingScheme.Base1,
-                    tags={
-                        "opfilter": f"!!{'LOP' if self._is_lop else 'OBJ/LIGHT'}!!",
-                        "oprelative": ".",
-                    },
-                )
-
-                light_group_item.addParmTemplate(light_group_name)
-                light_group_item.addParmTemplate(light_operator_list)
-                light_group_item.addParmTemplate(hou.SeparatorParmTemplate("lgSep#"))
-
-                light_groups.addParmTemplate(light_group_item)
-                folder.addParmTemplate(light_groups)
-
-            if file == OutputIdentifier.UTILITY:
-                folder.addParmTemplate(hou.SeparatorParmTemplate("sep5"))
-                aovs_tee = hou.FolderParmTemplate(
-                    "tees",
-                    "Shading AOVs (Tee)",
-                    folder_type=hou.folderType.MultiparmBlock,
-                )
-                aovs_tee.addParmTemplate(
-                    hou.MenuParmTemplate(
-                        "teeType_#",
-                        "",
-                        ("color", "float", "integer", "vector", "normal", "point"),
-                        ("Color", "Float", "Integer", "Vector", "Normal", "Point"),
-                        join_with_next=True,
-                        is_label_hidden=True,
-                    )
-                )
-                aovs_tee.addParmTemplate(
-                    hou.StringParmTemplate("teeName_#", "    Name", 1)
-                )
-                folder.addParmTemplate(aovs_tee)
-                tee_msg = hou.LabelParmTemplate(
-                    "teeInfo",
-                    "Info",
-                    column_labels=(
-                        "Use a PxrTee node in your shader to export a specific shading step.\n"
-                        "If you want to export something that isn't directly put into the shader, input the tee node "
-                        "into the userColor input.\n"
-                        "Use the PxrArithmetic node to combine multiple Tee nodes for export.",
-                    ),
-                )
-                tee_msg.setLabelParmType(hou.labelParmType.Message)
-                folder.addParmTemplate(tee_msg)
+            add_extra = extra_builders.get(file)
+            if add_extra:
+                add_extra(folder)
 
             # Add custom aovs block
             if file != OutputIdentifier.CRYPTOMATTE:
@@ -1256,7 +1539,7 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
             aovs_folder.addParmTemplate(folder)
 
         # Metadata
-        logging.debug("Adding metadata settings")
+        logger.debug("Adding metadata settings")
 
         metadata_folder = hou.FolderParmTemplate("metadata", "Metadata")
         metadata_folder.addParmTemplate(self._get_metadata_block())
@@ -1268,17 +1551,20 @@ usd_setattrib(0, @primpath, "driver:parameters:artist", chs("artist"));'
 
         # Objects
         if not self._is_lop:
-            logging.debug("Adding object settings")
+            logger.debug("Adding object settings")
 
-            hda_parms.addParmTemplate(rman_parms.findFolder("Objects"))
-            for parm in rman_parms.findFolder("Objects").parmTemplates():
-                self._link_parm(rman, parm.name())
+            objects_folder = rman_folders["Objects"]
+            hda_parms.addParmTemplate(objects_folder)
+            self._link_parms(
+                rman, (parm.name() for parm in objects_folder.parmTemplates())
+            )
 
         hda_def.setParmTemplateGroup(hda_parms)
+        self._apply_expressions()
 
         hda_def.save(hda_def.libraryFilePath(), hda, hda_options)
 
-        logging.debug("Saved hda")
+        logger.debug("Saved hda")
 
 
 if __name__ == "__main__":
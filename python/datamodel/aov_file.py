@@ -1,6 +1,8 @@
+import functools
+import itertools
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 
 import hou
 
@@ -44,6 +46,10 @@ class AOVOption:
     aovs: Optional[list[str]] = field(default_factory=list)
     default_value: Optional[bool] = False
     group: Optional[str] = None
+    parm_name: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.parm_name = f"{self.group}_{self.key}" if self.group else self.key
 
     def __repr__(self):
         return f"<AOVOption {self.key}>"
@@ -55,12 +61,10 @@ class AOVOption:
         Returns:
             str: Parm name
         """
-        if self.group:
-            return f"{self.group}_{self.key}"
-        return self.key
+        return self.parm_name
 
     def is_active(self, node: hou.Node) -> bool:
-        return node.parm(self.get_parm_name()).eval() == 1
+        return node.evalParm(self.parm_name) == 1
 
 
 @dataclass
@@ -85,6 +89,27 @@ class CustomAOV:
             return "color3f"
 
 
+@functools.lru_cache(maxsize=None)
+def _custom_parm_names(prefix: str, index: int) -> tuple[str, str, str, str]:
+    """
+    Get the disable, name, source and LPE parm names of a custom AOV instance,
+    cached as the same instances are looked up on every setup
+
+    Args:
+        prefix (str): Custom AOV parm prefix of the output file
+        index (int): Multiparm instance index
+
+    Returns:
+        tuple[str, str, str, str]: Disable, name, source and LPE parm names
+    """
+    return (
+        f"{prefix}Disable_{index}",
+        f"{prefix}Name_{index}",
+        f"{prefix}Source_{index}",
+        f"{prefix}LPE_{index}",
+    )
+
+
 @dataclass
 class OutputFile:
     identifier: OutputIdentifier
@@ -95,24 +120,49 @@ class OutputFile:
     notes: Optional[dict] = field(default_factory=dict)
     has_custom: Optional[bool] = False
     can_denoise: Optional[bool] = True
+    custom_prefix: str = field(init=False, repr=False, compare=False)
+    custom_count_parm: str = field(init=False, repr=False, compare=False)
+    aov_options: tuple[AOVOption, ...] = field(init=False, repr=False, compare=False)
+    all_aovs: tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Separators only matter for the layout, the AOV lookups skip them
+        self.aov_options = tuple(
+            option for option in self.options if isinstance(option, AOVOption)
+        )
+        self.all_aovs = tuple(
+            itertools.chain.from_iterable(option.aovs for option in self.aov_options)
+        )
+
+        name = self.identifier.value
+        self.custom_prefix = f"aov{name}Custom"
+        self.custom_count_parm = f"{name.lower()}CustomAOVs"
 
     def __repr__(self):
         return f"<OutputFile {self.identifier} ({self.bitdepth}, {self.compression}): {self.options}>"
 
-    def has_active_aovs(self, node: hou.Node) -> bool:
-        for option in self.options:
-            if type(option) is not AOVSeparator:
-                if option.is_active(node):
-                    return True
+    def _iter_active(self, node: hou.Node) -> Iterator[tuple[AOVOption, bool]]:
+        """
+        Iterate over the AOV options with their toggle state on the node
 
-        return False
+        Args:
+            node (hou.Node): RenderMan node
+
+        Returns:
+            Iterator[tuple[AOVOption, bool]]: Option and whether it is active
+        """
+        evaluate = node.evalParm
+        for option in self.aov_options:
+            yield option, evaluate(option.parm_name) == 1
+
+    def has_active_aovs(self, node: hou.Node) -> bool:
+        return any(active for _, active in self._iter_active(node))
 
     def has_active_custom_aovs(self, node: hou.Node) -> bool:
         if self.has_custom:
-            name = self.identifier
-            count = node.parm(f"{name.lower()}CustomAOVs").eval()
+            count = node.evalParm(self.custom_count_parm)
             for i in range(1, count + 1):
-                if not node.parm(f"aov{name}CustomDisable_{i}").evalAsInt():
+                if not node.evalParm(_custom_parm_names(self.custom_prefix, i)[0]):
                     return True
 
         return False
@@ -121,12 +171,16 @@ class OutputFile:
         aovs = []
         if self.has_custom:
             name = self.identifier
-            count = node.parm(f"{name.lower()}CustomAOVs").eval()
+            count = node.evalParm(self.custom_count_parm)
             for i in range(1, count + 1):
-                if not node.parm(f"aov{name}CustomDisable_{i}").evalAsInt():
-                    aov_name = node.parm(f"aov{name}CustomName_{i}").evalAsString()
-                    aov_type = node.parm(f"aov{name}CustomSource_{i}").evalAsString()
-                    aov_value = node.parm(f"aov{name}CustomLPE_{i}").evalAsString()
+                disable_parm, name_parm, source_parm, lpe_parm = _custom_parm_names(
+                    self.custom_prefix, i
+                )
+                if not node.evalParm(disable_parm):
+                    aov_name = node.evalParm(name_parm)
+                    # Menu parm, evaluated as its token instead of the index
+                    aov_type = node.parm(source_parm).evalAsString()
+                    aov_value = node.evalParm(lpe_parm)
 
                     if " " in aov_name:
                         raise Exception(
@@ -139,12 +193,11 @@ class OutputFile:
 
         # Add light groups to custom AOVs if Lighting file
         if self.identifier == OutputIdentifier.LIGHTING:
-            light_group_count = node.parm("light_groups_select").eval()
+            light_group_count = node.evalParm("light_groups_select")
+            prefix = "" if is_lop else "color lpe:"
 
             for j in range(1, light_group_count + 1):
-                light_group_name = node.parm(f"light_group_name_{j}").eval()
-
-                prefix = "" if is_lop else "color lpe:"
+                light_group_name = node.evalParm(f"light_group_name_{j}")
 
                 aovs.append(
                     CustomAOV(
@@ -156,10 +209,10 @@ class OutputFile:
 
         # Add tees to custom AOVs if Utility file
         if self.identifier == OutputIdentifier.UTILITY:
-            tee_count = node.parm("tees").eval()
+            tee_count = node.evalParm("tees")
 
             for j in range(1, tee_count + 1):
-                tee_name = node.parm(f"teeName_{j}").eval()
+                tee_name = node.evalParm(f"teeName_{j}")
                 aovs.append(
                     CustomAOV(
                         tee_name,
@@ -171,200 +224,224 @@ class OutputFile:
         return aovs
 
     def get_aovs(self):
-        aovs = []
-        for option in self.options:
-            if type(option) is not AOVSeparator:
-                aovs += option.aovs
+        return list(self.all_aovs)
 
-        return aovs
+    def partition_aovs(self, node: hou.Node) -> tuple[list[str], list[str]]:
+        """
+        Split the AOVs into active and inactive ones in a single pass
 
-    def get_active_aovs(self, node: hou.Node) -> list[str]:
+        Args:
+            node (hou.Node): RenderMan node
+
+        Returns:
+            tuple[list[str], list[str]]: Active and inactive AOVs
+        """
         active_aovs = []
-        for option in self.options:
-            if type(option) is not AOVSeparator:
-                if option.is_active(node):
-                    active_aovs += option.aovs
+        inactive_aovs = []
+        for option, active in self._iter_active(node):
+            if active:
+                active_aovs += option.aovs
+            else:
+                inactive_aovs += option.aovs
 
-        return active_aovs
+        return active_aovs, inactive_aovs
+
+    def get_active_aovs(self, node: hou.Node) -> list[str]:
+        return self.partition_aovs(node)[0]
 
     def get_inactive_aovs(self, node: hou.Node) -> list[str]:
-        inactive_aovs = []
-        for option in self.options:
-            if type(option) is not AOVSeparator:
-                if not option.is_active(node):
-                    inactive_aovs += option.aovs
-
-        return inactive_aovs
-
-
-output_files = [
-    OutputFile(
-        OutputIdentifier.BEAUTY,
-        True,
-        Bitdepth.HALF,
-        Compression.DWAA,
-        [AOVOption("beauty", "Beauty + Alpha", ["Ci", "a"], True)],
-    ),
-    OutputFile(
-        OutputIdentifier.SHADING,
-        False,
-        Bitdepth.HALF,
-        Compression.DWAA,
-        [
-            AOVOption("albedo", "Albedo", ["albedo"]),
-            AOVOption("emissive", "Emissive", ["emissive"]),
-            AOVOption(
-                "diffuse", "(In)direct Diffuse", ["directDiffuse", "indirectDiffuse"]
-            ),
-            AOVOption(
-                "diffuseU",
-                "(In)direct Diffuse Unoccluded",
-                ["directDiffuseUnoccluded", "indirectDiffuseUnoccluded"],
-            ),
-            AOVOption(
-                "specular",
-                "(In)direct Specular",
-                ["directSpecular", "indirectSpecular"],
-            ),
-            AOVOption(
-                "specularU",
-                "(In)direct Specular Unoccluded",
-                ["directSpecularUnoccluded", "indirectSpecularUnoccluded"],
-            ),
-            AOVOption("subsurface", "Subsurface", ["albedo"]),
-            AOVOption(
-                "diffuse",
-                "(In)direct Diffuse",
-                ["directDiffuseLobe", "indirectDiffuseLobe"],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularPrimary",
-                "(In)direct Specular Primary",
-                ["directSpecularPrimaryLobe", "indirectSpecularPrimaryLobe"],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularRough",
-                "(In)direct Specular Rough",
-                ["directSpecularRoughLobe", "indirectSpecularRoughLobe"],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularClearcoat",
-                "(In)direct Specular Clearcoat",
-                [
-                    "directSpecularClearcoatLobe",
-                    "indirectSpecularClearcoatLobe",
-                ],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularIridescence",
-                "(In)direct Specular Iridescence",
-                [
-                    "directSpecularIridescenceLobe",
-                    "indirectSpecularIridescenceLobe",
-                ],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularFuzz",
-                "(In)direct Specular Fuzz",
-                ["directSpecularFuzzLobe", "indirectSpecularFuzzLobe"],
-                group="lobes",
-            ),
-            AOVOption(
-                "specularGlass",
-                "(In)direct Specular Glass",
-                ["directSpecularGlassLobe", "indirectSpecularGlassLobe"],
-                group="lobes",
-            ),
-            AOVOption("subsurface", "Subsurface", ["subsurfaceLobe"], group="lobes"),
-            AOVOption(
-                "transmissiveSingleScatter",
-                "Transmissive Single Scatter",
-                ["transmissiveSingleScatterLobe"],
-                group="lobes",
-            ),
-            AOVOption(
-                "transmissiveGlass",
-                "Transmissive Glass",
-                ["transmissiveGlassLobe"],
-                group="lobes",
-            ),
-        ],
-        has_custom=True,
-    ),
-    OutputFile(
-        OutputIdentifier.LIGHTING,
-        False,
-        Bitdepth.HALF,
-        Compression.DWAA,
-        [
-            AOVOption("shadowOccluded", "Occluded", ["occluded"], group="shadow"),
-            AOVOption("shadowUnoccluded", "Unoccluded", ["unoccluded"], group="shadow"),
-            AOVOption("shadow", "Shadow", ["shadow"], group="shadow"),
-        ],
-        notes={
-            "shadow": "Enable the Holdout tag for an object to show up in the shadow AOVs",
-        },
-        has_custom=True,
-    ),
-    OutputFile(
-        OutputIdentifier.UTILITY,
-        False,
-        Bitdepth.FULL,
-        Compression.ZIPS,
-        [
-            AOVOption("curvature", "Curvature", ["curvature"]),
-            AOVOption("motionVector", "Motion Vector World Space", ["dPdtime"]),
-            AOVOption(
-                "motionVectorCamera",
-                "Motion Vector Camera Space",
-                ["dPcameradtime"],
-            ),
-            AOVSeparator("sep1"),
-            AOVOption("pWorld", "Position (world-space)", ["__Pworld"]),
-            AOVOption("nWorld", "Normal (world-space)", ["__Nworld"]),
-            AOVOption(
-                "depthAA",
-                "Depth (Anti-Aliased) + Facing Ratio",
-                ["__depth"],
-            ),
-            AOVOption("depth", "Depth (Aliased)", ["z"]),
-            AOVOption("st", "Texture Coordinates (UV maps)", ["__st"]),
-            AOVOption("pRef", "Reference Position", ["__Pref"]),
-            AOVOption("nRef", "Reference Normal", ["__Nref"]),
-            AOVOption("pRefWorld", "Reference World Position", ["__WPref"]),
-            AOVOption("nRefWorld", "Reference World Normal", ["__WNref"]),
-        ],
-        has_custom=True,
-        can_denoise=False,
-    ),
-    OutputFile(
-        OutputIdentifier.DEEP,
-        True,
-        Bitdepth.HALF,
-        Compression.DWAA,
-        [
-            AOVOption(
-                "deep",
-                "Deep",
-                ["Ci", "a"],
-            ),
-        ],
-        can_denoise=False,
-    ),
-    OutputFile(
-        OutputIdentifier.CRYPTOMATTE,
-        False,
-        Bitdepth.HALF,
-        Compression.ZIPS,
-        [
-            AOVOption("cryptoMaterial", "Material", ["user:__materialid"]),
-            AOVOption("cryptoName", "Name", ["identifier:object"]),
-            AOVOption("cryptoPath", "Path", ["identifier:name"]),
-        ],
-    ),
-]
+        return self.partition_aovs(node)[1]
+
+
+@functools.lru_cache(maxsize=None)
+def get_output_files() -> list[OutputFile]:
+    """
+    Get all output files, created on first use
+
+    Returns:
+        list[OutputFile]: Output files
+    """
+    return [
+        OutputFile(
+            OutputIdentifier.BEAUTY,
+            True,
+            Bitdepth.HALF,
+            Compression.DWAA,
+            [AOVOption("beauty", "Beauty + Alpha", ["Ci", "a"], True)],
+        ),
+        OutputFile(
+            OutputIdentifier.SHADING,
+            False,
+            Bitdepth.HALF,
+            Compression.DWAA,
+            [
+                AOVOption("albedo", "Albedo", ["albedo"]),
+                AOVOption("emissive", "Emissive", ["emissive"]),
+                AOVOption(
+                    "diffuse",
+                    "(In)direct Diffuse",
+                    ["directDiffuse", "indirectDiffuse"],
+                ),
+                AOVOption(
+                    "diffuseU",
+                    "(In)direct Diffuse Unoccluded",
+                    ["directDiffuseUnoccluded", "indirectDiffuseUnoccluded"],
+                ),
+                AOVOption(
+                    "specular",
+                    "(In)direct Specular",
+                    ["directSpecular", "indirectSpecular"],
+                ),
+                AOVOption(
+                    "specularU",
+                    "(In)direct Specular Unoccluded",
+                    ["directSpecularUnoccluded", "indirectSpecularUnoccluded"],
+                ),
+                AOVOption("subsurface", "Subsurface", ["albedo"]),
+                AOVOption(
+                    "diffuse",
+                    "(In)direct Diffuse",
+                    ["directDiffuseLobe", "indirectDiffuseLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularPrimary",
+                    "(In)direct Specular Primary",
+                    ["directSpecularPrimaryLobe", "indirectSpecularPrimaryLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularRough",
+                    "(In)direct Specular Rough",
+                    ["directSpecularRoughLobe", "indirectSpecularRoughLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularClearcoat",
+                    "(In)direct Specular Clearcoat",
+                    [
+                        "directSpecularClearcoatLobe",
+                        "indirectSpecularClearcoatLobe",
+                    ],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularIridescence",
+                    "(In)direct Specular Iridescence",
+                    [
+                        "directSpecularIridescenceLobe",
+                        "indirectSpecularIridescenceLobe",
+                    ],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularFuzz",
+                    "(In)direct Specular Fuzz",
+                    ["directSpecularFuzzLobe", "indirectSpecularFuzzLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "specularGlass",
+                    "(In)direct Specular Glass",
+                    ["directSpecularGlassLobe", "indirectSpecularGlassLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "subsurface", "Subsurface", ["subsurfaceLobe"], group="lobes"
+                ),
+                AOVOption(
+                    "transmissiveSingleScatter",
+                    "Transmissive Single Scatter",
+                    ["transmissiveSingleScatterLobe"],
+                    group="lobes",
+                ),
+                AOVOption(
+                    "transmissiveGlass",
+                    "Transmissive Glass",
+                    ["transmissiveGlassLobe"],
+                    group="lobes",
+                ),
+            ],
+            has_custom=True,
+        ),
+        OutputFile(
+            OutputIdentifier.LIGHTING,
+            False,
+            Bitdepth.HALF,
+            Compression.DWAA,
+            [
+                AOVOption("shadowOccluded", "Occluded", ["occluded"], group="shadow"),
+                AOVOption(
+                    "shadowUnoccluded", "Unoccluded", ["unoccluded"], group="shadow"
+                ),
+                AOVOption("shadow", "Shadow", ["shadow"], group="shadow"),
+            ],
+            notes={
+                "shadow": "Enable the Holdout tag for an object to show up in the shadow AOVs",
+            },
+            has_custom=True,
+        ),
+        OutputFile(
+            OutputIdentifier.UTILITY,
+            False,
+            Bitdepth.FULL,
+            Compression.ZIPS,
+            [
+                AOVOption("curvature", "Curvature", ["curvature"]),
+                AOVOption("motionVector", "Motion Vector World Space", ["dPdtime"]),
+                AOVOption(
+                    "motionVectorCamera",
+                    "Motion Vector Camera Space",
+                    ["dPcameradtime"],
+                ),
+                AOVSeparator("sep1"),
+                AOVOption("pWorld", "Position (world-space)", ["__Pworld"]),
+                AOVOption("nWorld", "Normal (world-space)", ["__Nworld"]),
+                AOVOption(
+                    "depthAA",
+                    "Depth (Anti-Aliased) + Facing Ratio",
+                    ["__depth"],
+                ),
+                AOVOption("depth", "Depth (Aliased)", ["z"]),
+                AOVOption("st", "Texture Coordinates (UV maps)", ["__st"]),
+                AOVOption("pRef", "Reference Position", ["__Pref"]),
+                AOVOption("nRef", "Reference Normal", ["__Nref"]),
+                AOVOption("pRefWorld", "Reference World Position", ["__WPref"]),
+                AOVOption("nRefWorld", "Reference World Normal", ["__WNref"]),
+            ],
+            has_custom=True,
+            can_denoise=False,
+        ),
+        OutputFile(
+            OutputIdentifier.DEEP,
+            True,
+            Bitdepth.HALF,
+            Compression.DWAA,
+            [
+                AOVOption(
+                    "deep",
+                    "Deep",
+                    ["Ci", "a"],
+                ),
+            ],
+            can_denoise=False,
+        ),
+        OutputFile(
+            OutputIdentifier.CRYPTOMATTE,
+            False,
+            Bitdepth.HALF,
+            Compression.ZIPS,
+            [
+                AOVOption("cryptoMaterial", "Material", ["user:__materialid"]),
+                AOVOption("cryptoName", "Name", ["identifier:object"]),
+                AOVOption("cryptoPath", "Path", ["identifier:name"]),
+            ],
+        ),
+    ]
+
+
+def __getattr__(name: str):
+    # Keep aov_file.output_files working for existing imports
+    if name == "output_files":
+        return get_output_files()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -183,8 +183,7 @@ class FarmSubmission(QtWidgets.QWidget):
         # Batch name
         batch_name_template = self.app.get_template("deadline_batch_name")
         if batch_name_template:
-            work_template = self.app.get_template("work_file_template")
-            fields = work_template.get_fields(hou.hipFile.path())
+            fields = self.app.get_work_fields(hou.hipFile.path())
             batch_name = batch_name_template.apply_fields(fields)
             job_info.append(f"BatchName={batch_name}")
 
@@ -253,9 +252,7 @@ class FarmSubmission(QtWidgets.QWidget):
             hou.ui.displayMessage("Job successfully submitted to Deadline")
 
         except Exception as e:
-            self.app.logger.debug(
-                "An error occured while submitting to farm. %s" % str(e)
-            )
+            self.app.logger.debug("An error occured while submitting to farm. %s", e)
 
         finally:
             shutil.rmtree(temporary_directory)
@@ -20,6 +20,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
 import json
 import os
 import platform
@@ -35,6 +36,13 @@ from ..datamodel.lpe import LPEControl
 from ..datamodel.metadata import MetaData
 from ..datamodel.render_engine import RenderEngine
 
+# Translation table to normalize path separators, only needed where os.sep isn't "/"
+SEP_TABLE = str.maketrans({os.sep: "/"}) if os.sep != "/" else None
+
+# User data keys storing what the AOV multiparms and metadata were last set up for
+AOV_LAYOUT_USER_DATA = "sgtk_aov_layout"
+METADATA_USER_DATA = "sgtk_metadata"
+
 
 class TkRenderManNodeHandler(object):
     def __init__(self, app):
@@ -187,11 +195,12 @@ class TkRenderManNodeHandler(object):
             if light_node.type().name().startswith("light"):
                 lpe_parm = light_node.parm(lpe_tag.get_light_group(is_lop))
                 if lpe_parm:
-                    expressions_to_keep = ""
-                    for expression in lpe_parm.eval().split():
-                        # We only remove our own LPE tags so the custom ones remain.
-                        if not expression.startswith("LG_"):
-                            expressions_to_keep += expression
+                    # We only remove our own LPE tags so the custom ones remain.
+                    expressions_to_keep = "".join(
+                        expression
+                        for expression in lpe_parm.eval().split()
+                        if not expression.startswith("LG_")
+                    )
 
                     lpe_parm.set(expressions_to_keep)
 
@@ -209,7 +218,7 @@ class TkRenderManNodeHandler(object):
 
             light_groups_info[light_group_name] = selected_light_lops.split()
 
-        lights_list = []
+        lights_list = set()
         for light_group in light_groups_info:
             if not re.match(r"^[A-Za-z0-9_]+$", light_group):
                 hou.ui.displayMessage(
@@ -223,7 +232,7 @@ class TkRenderManNodeHandler(object):
             for light in light_groups_info[light_group]:
                 try:
                     if light not in lights_list:
-                        lights_list.append(light)
+                        lights_list.add(light)
                         light_node = hou.node(light)
 
                         if is_lop:
@@ -256,34 +265,26 @@ class TkRenderManNodeHandler(object):
             indices_to_remove = []
             # Collect our automated render variables, so we can remove only those
             for i in range(1, extra_render_variables.eval() + 1):
-                if karma_render_settings.parm(
-                    f"name{i}"
-                ) and karma_render_settings.parm(f"name{i}").eval().startswith("LG_"):
+                name_parm = karma_render_settings.parm(f"name{i}")
+                if name_parm and name_parm.eval().startswith("LG_"):
                     indices_to_remove.append(i)
 
             # Remove instances from the last to the first to avoid re-indexing issues
             for i in reversed(indices_to_remove):
                 # Instance indices are 1-based, but removal is 0-based
-                karma_render_settings.parm("extrarendervars").removeMultiParmInstance(
-                    i - 1
-                )
+                extra_render_variables.removeMultiParmInstance(i - 1)
 
             # Add our automated light groups back in
-            for light_group in light_groups_info:
-                render_variable_index = extra_render_variables.eval() + 1
-                extra_render_variables.set(render_variable_index)
-                karma_render_settings.parm(f"name{render_variable_index}").set(
-                    f"LG_{light_group}"
-                )
-                karma_render_settings.parm(f"format{render_variable_index}").set(
-                    "color3f"
-                )
-                karma_render_settings.parm(f"sourceName{render_variable_index}").set(
-                    f"C.*<L.'LG_{light_group}'>"
-                )
-                karma_render_settings.parm(f"sourceType{render_variable_index}").set(
-                    "lpe"
-                )
+            first_index = extra_render_variables.eval() + 1
+            extra_render_variables.set(first_index - 1 + len(light_groups_info))
+
+            render_variables = {}
+            for i, light_group in enumerate(light_groups_info, first_index):
+                render_variables[f"name{i}"] = f"LG_{light_group}"
+                render_variables[f"format{i}"] = "color3f"
+                render_variables[f"sourceName{i}"] = f"C.*<L.'LG_{light_group}'>"
+                render_variables[f"sourceType{i}"] = "lpe"
+            karma_render_settings.setParms(render_variables)
 
         if show_notification:
             hou.ui.displayMessage(
@@ -347,20 +348,22 @@ class TkRenderManNodeHandler(object):
 
     @staticmethod
     def _lop_setup_custom_aovs(node: hou.Node, custom_aovs: list[aov_file.CustomAOV]):
+        values = {}
         for i, aov in enumerate(custom_aovs):
             aov: aov_file.CustomAOV
-            node.parm(f"name{i + 1}").set(aov.name)
-            node.parm(f"format{i + 1}").set(aov.get_format())
-            node.parm(f"dataType{i + 1}").set("")
-            node.parm(f"sourceName{i + 1}").set(aov.lpe)
-            node.parm(f"sourceType{i + 1}").set("lpe")
+            values[f"name{i + 1}"] = aov.name
+            values[f"format{i + 1}"] = aov.get_format()
+            values[f"dataType{i + 1}"] = ""
+            values[f"sourceName{i + 1}"] = aov.lpe
+            values[f"sourceType{i + 1}"] = "lpe"
+        node.setParms(values)
 
     @staticmethod
     def get_active_files(node: hou.Node):
         output_files = 0
         active_files = []
 
-        for file in aov_file.output_files:
+        for file in aov_file.get_output_files():
             if file.has_active_aovs(node) or file.has_active_custom_aovs(node):
                 active_files.append(file)
                 if file.identifier != aov_file.OutputIdentifier.CRYPTOMATTE:
@@ -370,7 +373,7 @@ class TkRenderManNodeHandler(object):
             # If file is Lighting and there are light groups
             if (
                 file.identifier == aov_file.OutputIdentifier.LIGHTING
-                and node.parm("light_groups_select").eval() > 0
+                and node.evalParm("light_groups_select") > 0
             ):
                 active_files.append(file)
                 output_files += 1
@@ -379,50 +382,140 @@ class TkRenderManNodeHandler(object):
             # If file is Utility and there are tees
             if (
                 file.identifier == aov_file.OutputIdentifier.UTILITY
-                and node.parm("tees").eval() > 0
+                and node.evalParm("tees") > 0
             ):
                 active_files.append(file)
                 output_files += 1
                 continue
         return [output_files, active_files]
 
+    @staticmethod
+    def _get_active_cryptomattes(
+        node: hou.Node, file: aov_file.OutputFile
+    ) -> list[aov_file.AOVOption]:
+        """Get the enabled cryptomatte options of the cryptomatte file
+
+        Args:
+            node (hou.Node): RenderMan node
+            file (aov_file.OutputFile): Cryptomatte output file
+        """
+        return [crypto for crypto in file.options if node.evalParm(crypto.key)]
+
+    def _get_file_output_paths(
+        self, node: hou.Node, active_files: list[aov_file.OutputFile], fields: dict
+    ) -> dict[str, str]:
+        """Get the output paths of all active files, keyed by their aov name.
+        Each enabled cryptomatte gets its own path.
+
+        Args:
+            node (hou.Node): RenderMan node
+            active_files (list[aov_file.OutputFile]): Active output files
+            fields (dict): Output fields from _get_output_fields
+        """
+        paths = {}
+        for file in active_files:
+            if file.identifier == aov_file.OutputIdentifier.CRYPTOMATTE:
+                for crypto in self._get_active_cryptomattes(node, file):
+                    paths[crypto.key] = self._apply_output_fields(fields, crypto.key)
+            else:
+                aov_name = file.identifier.lower()
+                paths[aov_name] = self._apply_output_fields(fields, aov_name)
+        return paths
+
+    @staticmethod
+    def _get_signature(data) -> str:
+        """Get a short stable hash of JSON serializable data
+
+        Args:
+            data: Data to hash
+        """
+        return hashlib.blake2b(json.dumps(data).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _set_multiparm_count(parm: hou.Parm, count: int, reset: bool):
+        """Set the instance count of a multiparm
+
+        Args:
+            parm (hou.Parm): Multiparm count parm
+            count (int): Amount of instances
+            reset (bool): Remove all existing instances first, restoring their defaults
+        """
+        if reset:
+            parm.set(0)
+        elif parm.eval() == count:
+            return
+        parm.set(count)
+
+    @staticmethod
+    def _collect_active_aovs(
+        node: hou.Node, active_files: list[aov_file.OutputFile]
+    ) -> dict[aov_file.OutputIdentifier, list[str]]:
+        """Evaluate the active AOVs of every active file in a single pass
+
+        Args:
+            node (hou.Node): RenderMan node
+            active_files (list[aov_file.OutputFile]): Active output files
+        """
+        return {
+            file.identifier: file.get_active_aovs(node)
+            for file in active_files
+            if file.identifier != aov_file.OutputIdentifier.CRYPTOMATTE
+        }
+
     def setup_aovs(self, node: hou.Node, show_notification: bool = True) -> bool:
+        """Setup outputs on the RenderMan node with correct aovs, as a single undo step
+
+        Args:
+            node (hou.Node): RenderMan node
+            show_notification (bool): Show notification when successfully set up AOVs
+        """
+        with hou.undos.group("Setup AOVs"):
+            return self._setup_aovs(node, show_notification)
+
+    def _setup_aovs(self, node: hou.Node, show_notification: bool) -> bool:
         is_lop = isinstance(node, hou.LopNode)
 
         # Validate node
         if not self.validate_node(node, "lop" if is_lop else "driver"):
             return False
 
-        use_denoise = node.parm("denoise").eval()
-        use_autocrop = node.parm("autocrop").eval()
+        use_denoise = node.evalParm("denoise")
+        use_autocrop = node.evalParm("autocrop")
 
         # Get active files
         output_files, active_files = self.get_active_files(node)
+        active_aovs = self._collect_active_aovs(node, active_files)
+        output_fields = self._get_output_fields(node)
+        output_paths = self._get_file_output_paths(node, active_files, output_fields)
+
+        # Existing multiparm instances are only torn down when the output layout
+        # changed, otherwise they get overwritten in place
+        layout = self._get_signature(
+            [
+                [file.identifier, active_aovs.get(file.identifier)]
+                for file in active_files
+            ]
+        )
+        reset = node.userData(AOV_LAYOUT_USER_DATA) != layout
 
         # Metadata
-        md_config = self.app.get_setting("render_metadata")
+        md_config = self.app.get_metadata_config()
 
         md_items = [
             MetaData("colorspace", "string", "ACES - ACEScg"),
         ]
         md_config_groups = {}
         for md in md_config:
-            key = f'rmd_{md.get("key")}'
+            key = f"rmd_{md.key}"
             md_items.append(
                 MetaData(
                     key,
-                    md.get("type"),
-                    f'`{md.get("expression")}`'
-                    if md.get("expression")
-                    else md.get("value"),
+                    md.type,
+                    f"`{md.expression}`" if md.expression else md.value,
                 )
             )
-            group = md.get("group")
             # TODO should use prefixed version in group mapping?
-            if md_config_groups.get(group):
-                md_config_groups.get(group).append(key)
-            else:
-                md_config_groups[group] = [key]
+            md_config_groups.setdefault(md.group, []).append(key)
         md_items.append(
             MetaData("rmd_PostRenderGroups", "string", json.dumps(md_config_groups))
         )
@@ -483,8 +576,43 @@ class TkRenderManNodeHandler(object):
                 "The app tk-multi-breakdown is not installed, skipping used publish version metadata."
             )
 
+        # Custom metadata on the node, in the LOP network these are read from the
+        # node itself
+        if not is_lop:
+            for j in range(1, node.evalParm("metadata_entries") + 1):
+                md_key = node.evalParm(f"metadata_{j}_key")
+                md_type = node.parm(f"metadata_{j}_type").evalAsString()
+                md_value_parm = node.parm(f"metadata_{j}_{md_type}")
+                try:
+                    md_value = f"`{md_value_parm.expression()}`"
+                except:
+                    md_value = md_value_parm.rawValue()
+
+                md_items.append(MetaData(md_key, md_type, md_value))
+
+        # Metadata is only rewritten when it changed since the last setup. The
+        # layout is part of it, as rebuilt displays lose their metadata.
+        md_signature = self._get_signature(
+            [
+                layout,
+                md_artist,
+                [[item.key, item.type, item.value] for item in md_items],
+            ]
+        )
+        write_metadata = node.userData(METADATA_USER_DATA) != md_signature
+
+        # Expression values are converted once for all displays, with their channel
+        # references made relative to the internal node
+        md_expressions = [
+            re.sub(r"(ch[a-z]*)(\()([\"'])", r"\1(\3../", item.value[1:-1])
+            if "`" in item.value
+            else None
+            for item in md_items
+        ]
+
         self.app.logger.debug(
-            f"Setting up aovs for files: {', '.join([file.identifier.value for file in active_files])}"
+            "Setting up aovs for files: %s",
+            ", ".join(file.identifier.value for file in active_files),
         )
 
         if is_lop:
@@ -496,15 +624,17 @@ class TkRenderManNodeHandler(object):
                 node_products.parm("products").set(output_files - 1)
 
             # Disable all
-            for group in node_aovs.parmTemplateGroup().parmTemplates():
-                parms: list[hou.ParmTemplate, ...] = [
-                    parm
-                    for parm in group.parmTemplates()
-                    if "precision" not in parm.name()
-                ]
-                for parm in parms:
-                    node_rman.parm(parm.name()).set(False)
-                    node_aovs.parm(parm.name()).set(False)
+            disabled_aovs = {
+                parm.name(): False
+                for group in node_aovs.parmTemplateGroup().parmTemplates()
+                for parm in group.parmTemplates()
+                if "precision" not in parm.name()
+            }
+
+            # Parameter values are collected per node and set in one go
+            rman_values = dict(disabled_aovs)
+            aovs_values = dict(disabled_aovs)
+            products_values = {}
 
             custom_aovs: list[aov_file.CustomAOV] = []
 
@@ -514,27 +644,21 @@ class TkRenderManNodeHandler(object):
 
                 # Crypto
                 if file.identifier == aov_file.OutputIdentifier.CRYPTOMATTE:
-                    cryptomattes = [
-                        crypto
-                        for crypto in file.options
-                        if node.parm(crypto.key).eval()
-                    ]
+                    cryptomattes = self._get_active_cryptomattes(node, file)
                     for j in range(0, len(file.options)):
                         if j < len(cryptomattes):
                             crypto = cryptomattes[j]
-                            node_rman.parm(f"xn__risamplefilter{j}name_w6an").set(
-                                "PxrCryptomatte"
-                            )
-                            node_rman.parm(
+                            rman_values[
+                                f"xn__risamplefilter{j}name_w6an"
+                            ] = "PxrCryptomatte"
+                            rman_values[
                                 f"xn__risamplefilter{j}PxrCryptomattefilename_70bno"
-                            ).set(self.get_output_path(node, crypto.key))
-                            node_rman.parm(
+                            ] = output_paths[crypto.key]
+                            rman_values[
                                 f"xn__risamplefilter{j}PxrCryptomattelayer_cwbno"
-                            ).set(crypto.aovs[0])
+                            ] = crypto.aovs[0]
                         else:
-                            node_rman.parm(f"xn__risamplefilter{j}name_w6an").set(
-                                "None"
-                            )
+                            rman_values[f"xn__risamplefilter{j}name_w6an"] = "None"
                     continue
 
                 # Add custom AOVs
@@ -547,87 +671,85 @@ class TkRenderManNodeHandler(object):
                 # For first aov
                 if i == 0:
                     # Set file output path
-                    node_rman.parm("picture").set(
-                        self.get_output_path(node, file.identifier.lower())
-                    )
+                    rman_values["picture"] = output_paths[file.identifier.lower()]
 
                     # Set as RGBA
-                    node_rman.parm(f"xn__driverparametersopenexrasrgba_bobkh").set(
+                    rman_values["xn__driverparametersopenexrasrgba_bobkh"] = (
                         file.as_rgba and not (file.can_denoise and use_denoise)
                     )
 
                     # Set output type
                     if file.identifier == aov_file.OutputIdentifier.DEEP:
-                        node_rman.parm("productType").set("deepexr")
+                        rman_values["productType"] = "deepexr"
                     # Set use autocrop
-                    node_rman.parm("xn__driverparametersopenexrautocrop_krbkh").set(
+                    rman_values["xn__driverparametersopenexrautocrop_krbkh"] = (
                         "on" if use_autocrop else "off"
                     )
                     # Set bitdepth level
-                    node_rman.parm("xn__driverparametersopenexrexrpixeltype_2xbkh").set(
-                        file.bitdepth
-                    )
+                    rman_values[
+                        "xn__driverparametersopenexrexrpixeltype_2xbkh"
+                    ] = file.bitdepth
                     # Set compression type
-                    node_rman.parm(
+                    rman_values[
                         "xn__driverparametersopenexrexrcompression_c1bkh"
-                    ).set(file.compression)
+                    ] = file.compression
 
                     # Add custom AOVs
-                    node_rman.parm("extrarendervars").set(0)
-                    node_rman.parm("extrarendervars").set(len(local_custom_aovs))
+                    self._set_multiparm_count(
+                        node_rman.parm("extrarendervars"), len(local_custom_aovs), reset
+                    )
                     self._lop_setup_custom_aovs(node_rman, local_custom_aovs)
                 # And the others
                 else:
                     custom_aovs += local_custom_aovs
 
                     # Set file settings
-                    node_products.parm(f"primname_{i - 1}").set(
-                        file.identifier.value.lower()
-                    )
+                    products_values[f"primname_{i - 1}"] = file.identifier.value.lower()
                     # Set file output path
-                    node_products.parm(f"productName_{i - 1}").set(
-                        self.get_output_path(node, file.identifier.lower())
-                    )
+                    products_values[f"productName_{i - 1}"] = output_paths[
+                        file.identifier.lower()
+                    ]
                     if file.identifier == aov_file.OutputIdentifier.DEEP:
-                        node_products.parm(f"productType_{i - 1}").set("deepexr")
-                    node_products.parm(f"doorderedVars_{i - 1}").set(True)
-                    node_products.parm(f"orderedVars_{i - 1}").set(
-                        " ".join(
-                            [
-                                f"/Render/Products/Vars/{aov}"
-                                for aov in file.get_active_aovs(node)
-                            ]
-                            + [
-                                f"/Render/Products/Vars/{aov.name}"
-                                for aov in local_custom_aovs
-                            ]
-                        )
-                    )
-                    node_products.parm(f"autocrop_{i - 1}").set(use_autocrop)
-                    node_products.parm(f"openexr_bitdepth_{i - 1}").set(file.bitdepth)
-                    node_products.parm(f"openexr_compression_{i - 1}").set(
-                        file.compression
+                        products_values[f"productType_{i - 1}"] = "deepexr"
+                    products_values[f"doorderedVars_{i - 1}"] = True
+                    products_values[f"orderedVars_{i - 1}"] = " ".join(
+                        [
+                            f"/Render/Products/Vars/{aov}"
+                            for aov in active_aovs[file.identifier]
+                        ]
+                        + [
+                            f"/Render/Products/Vars/{aov.name}"
+                            for aov in local_custom_aovs
+                        ]
                     )
+                    products_values[f"autocrop_{i - 1}"] = use_autocrop
+                    products_values[f"openexr_bitdepth_{i - 1}"] = file.bitdepth
+                    products_values[f"openexr_compression_{i - 1}"] = file.compression
 
                 # Enable active AOVs
-                active_node = node_rman if i == 0 else node_aovs
-                for active_aov in file.get_active_aovs(node):
-                    active_node.parm(active_aov).set(True)
+                active_values = rman_values if i == 0 else aovs_values
+                for active_aov in active_aovs[file.identifier]:
+                    active_values[active_aov] = True
 
             node_custom_aovs = node.node("custom_aovs")
-            node_custom_aovs.parm("rendervars").set(0)
-            node_custom_aovs.parm("rendervars").set(len(custom_aovs))
+            self._set_multiparm_count(
+                node_custom_aovs.parm("rendervars"), len(custom_aovs), reset
+            )
             self._lop_setup_custom_aovs(node_custom_aovs, custom_aovs)
 
             # Statistics
-            node_rman.parm("xn__ristatisticsxmlfilename_febk").set(
-                self.get_output_path(node, "stats")[:-3] + "xml"
+            rman_values["xn__ristatisticsxmlfilename_febk"] = (
+                self._apply_output_fields(output_fields, "stats")[:-3] + "xml"
             )
 
+            node_rman.setParms(rman_values)
+            node_aovs.setParms(aovs_values)
+            node_products.setParms(products_values)
+
             # Metadata
             # Check if custom metadata has valid keys
             for j in range(1, node.evalParm("metadata_entries") + 1):
-                md_key = node.parm(f"metadata_{j}_key").eval()
+                md_key = node.evalParm(f"metadata_{j}_key")
                 if not re.match(r"^[A-Za-z0-9_]+$", md_key):
                     hou.ui.displayMessage(
                         f'The metadata key "{md_key}" is invalid. You can only use letters, numbers, and '
@@ -636,135 +758,119 @@ class TkRenderManNodeHandler(object):
                     )
                     return False
 
-            node_md = node.node("sg_metadata")
+            if write_metadata:
+                node_md = node.node("sg_metadata")
 
-            node_md.parm("artist").set(md_artist)
+                md_entries = node_md.parm("metadata_entries")
+                md_entries.set(0)
+                md_entries.set(len(md_items))
 
-            node_md.parm("metadata_entries").set(0)
-            node_md.parm("metadata_entries").set(len(md_items))
+                md_values = {"artist": md_artist}
 
-            for i, item in enumerate(md_items):
-                item: MetaData
+                for i, (item, expression) in enumerate(zip(md_items, md_expressions)):
+                    item: MetaData
 
-                node_md.parm(f"metadata_{i + 1}_key").set(item.key)
-                node_md.parm(f"metadata_{i + 1}_type").set(item.type)
-                if "`" in item.value:
-                    expression = item.value[1:-1]
-                    expression = re.sub(
-                        r"(ch[a-z]*)(\()([\"'])", r"\1(\3../", expression
-                    )
+                    md_values[f"metadata_{i + 1}_key"] = item.key
+                    md_values[f"metadata_{i + 1}_type"] = item.type
+                    if expression is not None:
+                        node_md.parm(f"metadata_{i + 1}_{item.type}").setExpression(
+                            expression
+                        )
+                    else:
+                        md_values[f"metadata_{i + 1}_{item.type}"] = item.value
 
-                    node_md.parm(f"metadata_{i + 1}_{item.type}").setExpression(
-                        expression
-                    )
-                else:
-                    node_md.parm(f"metadata_{i + 1}_{item.type}").set(item.value)
+                node_md.setParms(md_values)
         else:
             rman = node.node("render")
-            rman.parm("ri_displays").set(0)
-            rman.parm("ri_displays").set(output_files)
+            self._set_multiparm_count(rman.parm("ri_displays"), output_files, reset)
 
             # Denoise
             node.node("denoise").parm("output").set(
-                os.path.dirname(self.get_output_path(node, "denoise"))
+                os.path.dirname(self._apply_output_fields(output_fields, "denoise"))
             )
 
             # Statistics
-            rman.parm("ri_statistics_xmlfilename").set(
-                self.get_output_path(node, "stats")[:-3] + "xml"
-            )
+            stats_path = self._apply_output_fields(output_fields, "stats")[:-3] + "xml"
+
+            # Parameter values are collected and set in one go
+            rman_values = {"ri_statistics_xmlfilename": stats_path}
 
             for i, file in enumerate(active_files):
                 file: aov_file.OutputFile
 
                 # Crypto
                 if file.identifier == aov_file.OutputIdentifier.CRYPTOMATTE:
-                    cryptomattes = [
-                        crypto
-                        for crypto in file.options
-                        if node.parm(crypto.key).eval()
-                    ]
+                    cryptomattes = self._get_active_cryptomattes(node, file)
 
-                    rman.parm("ri_samplefilters").set(0)
-                    rman.parm("ri_samplefilters").set(len(cryptomattes))
+                    self._set_multiparm_count(
+                        rman.parm("ri_samplefilters"), len(cryptomattes), reset
+                    )
                     for j, c in enumerate(cryptomattes):
                         name = f"Crypto{c.name}"
-                        rman.parm(f"ri_samplefilter{j}").set(f"../aovs/{name}")
-                        node.parm("./aovs/" + name + "/filename").set(
-                            self.get_output_path(node, name)
-                        )
+                        rman_values[f"ri_samplefilter{j}"] = f"../aovs/{name}"
+                        node.parm(f"./aovs/{name}/filename").set(output_paths[c.key])
                     continue
 
-                rman.parm(f"ri_display_{i}").set(
-                    self.get_output_path(node, file.identifier.lower())
-                )
-
-                if file.identifier == aov_file.OutputIdentifier.DEEP:
-                    rman.parm(f"ri_device_{i}").set("deepexr")
+                denoise_on = file.can_denoise and use_denoise
 
-                rman.parm(f"ri_autocrop_{i}").set("on" if use_autocrop else "off")
-                rman.parm(f"ri_exrpixeltype_{i}").set(file.bitdepth)
-                rman.parm(f"ri_exrcompression_{i}").set(file.compression)
+                rman_values[f"ri_display_{i}"] = output_paths[file.identifier.lower()]
 
-                denoise_on = file.can_denoise and use_denoise
-                rman.parm(f"ri_denoiseon_{i}").set(denoise_on)
+                if file.identifier == aov_file.OutputIdentifier.DEEP:
+                    rman_values[f"ri_device_{i}"] = "deepexr"
 
-                rman.parm(f"ri_asrgba_{i}").set(file.as_rgba and not denoise_on)
+                rman_values[f"ri_autocrop_{i}"] = "on" if use_autocrop else "off"
+                rman_values[f"ri_exrpixeltype_{i}"] = file.bitdepth
+                rman_values[f"ri_exrcompression_{i}"] = file.compression
+                rman_values[f"ri_denoiseon_{i}"] = denoise_on
+                rman_values[f"ri_asrgba_{i}"] = file.as_rgba and not denoise_on
 
                 # Disable defaults
-                rman.parm(f"ri_quickaov_Ci_{i}").set(False)
-                rman.parm(f"ri_quickaov_a_{i}").set(False)
+                rman_values[f"ri_quickaov_Ci_{i}"] = False
+                rman_values[f"ri_quickaov_a_{i}"] = False
 
                 # Enable active AOVs
-                for aov in file.get_active_aovs(node):
-                    rman.parm(f"ri_quickaov_{aov}_{i}").set(True)
+                for aov in active_aovs[file.identifier]:
+                    rman_values[f"ri_quickaov_{aov}_{i}"] = True
 
                 # Add custom AOVs
                 custom_aovs = file.get_active_custom_aovs(node)
 
-                rman.parm(f"ri_numcustomaovs_{i}").set(0)
-                rman.parm(f"ri_numcustomaovs_{i}").set(len(custom_aovs))
+                self._set_multiparm_count(
+                    rman.parm(f"ri_numcustomaovs_{i}"), len(custom_aovs), reset
+                )
                 for j, aov in enumerate(custom_aovs):
                     aov: aov_file.CustomAOV
-                    rman.parm(f"ri_aovvariable_{i}_{j}").set(aov.name)
-                    rman.parm(f"ri_aovtype_{i}_{j}").set(aov.type)
-                    rman.parm(f"ri_aovsource_{i}_{j}").set(aov.lpe)
-
-                node_md = node.node("render")
-                for j in range(1, node.evalParm("metadata_entries") + 1):
-                    md_key = node.parm(f"metadata_{j}_key").eval()
-                    md_type = node.parm(f"metadata_{j}_type").evalAsString()
-                    md_value_parm = node.parm(f"metadata_{j}_{md_type}")
-                    try:
-                        md_value = f"`{md_value_parm.expression()}`"
-                    except:
-                        md_value = md_value_parm.rawValue()
-
-                    md_items.append(MetaData(md_key, md_type, md_value))
-
-                node_md.parm(f"ri_exr_metadata_{i}").set(0)
-                node_md.parm(f"ri_exr_metadata_{i}").set(len(md_items))
-
-                node_md.parm(f"ri_image_Artist_{i}").set(md_artist)
-
-                for j, item in enumerate(md_items):
-                    item: MetaData
+                    rman_values[f"ri_aovvariable_{i}_{j}"] = aov.name
+                    rman_values[f"ri_aovtype_{i}_{j}"] = aov.type
+                    rman_values[f"ri_aovsource_{i}_{j}"] = aov.lpe
+
+                if write_metadata:
+                    exr_metadata = rman.parm(f"ri_exr_metadata_{i}")
+                    exr_metadata.set(0)
+                    exr_metadata.set(len(md_items))
+
+                    rman_values[f"ri_image_Artist_{i}"] = md_artist
+
+                    for j, (item, expression) in enumerate(
+                        zip(md_items, md_expressions)
+                    ):
+                        item: MetaData
+
+                        rman_values[f"ri_exr_metadata_key_{i}_{j}"] = item.key
+                        rman_values[f"ri_exr_metadata_type_{i}_{j}"] = item.type
+                        if expression is not None:
+                            rman.parm(
+                                f"ri_exr_metadata_{item.type}_{i}_{j}_"
+                            ).setExpression(expression)
+                        else:
+                            rman_values[
+                                f"ri_exr_metadata_{item.type}_{i}_{j}_"
+                            ] = item.value
 
-                    node_md.parm(f"ri_exr_metadata_key_{i}_{j}").set(item.key)
-                    node_md.parm(f"ri_exr_metadata_type_{i}_{j}").set(item.type)
-                    if "`" in item.value:
-                        expression = item.value[1:-1]
-                        expression = re.sub(
-                            r"(ch[a-z]*)(\()([\"'])", r"\1(\3../", expression
-                        )
+            rman.setParms(rman_values)
 
-                        node_md.parm(
-                            f"ri_exr_metadata_{item.type}_{i}_{j}_"
-                        ).setExpression(expression)
-                    else:
-                        node_md.parm(f"ri_exr_metadata_{item.type}_{i}_{j}_").set(
-                            item.value
-                        )
+        node.setUserData(AOV_LAYOUT_USER_DATA, layout)
+        node.setUserData(METADATA_USER_DATA, md_signature)
 
         msg = f"Setup AOVs complete with {len(active_files)} files."
         if show_notification:
@@ -775,18 +881,16 @@ class TkRenderManNodeHandler(object):
 
     @staticmethod
     def _set_expression(node: hou.Node, source_parm: str, dist_parm: str):
-        org_parm = node.parm(dist_parm).parmTemplate()
-        if not org_parm:
+        parm = node.parm(dist_parm)
+        if not parm:
             print("parm not found: ", dist_parm)
             return
 
         parm_type = "ch"
-        if org_parm.dataType() == hou.parmData.String:
+        if parm.parmTemplate().dataType() == hou.parmData.String:
             parm_type = "chsop"
 
-        node.parm(dist_parm).setExpression(
-            '{}("{}{}")'.format(parm_type, "../", source_parm)
-        )
+        parm.setExpression(f'{parm_type}("../{source_parm}")')
 
     def get_output_path(self, node: hou.Node, aov_name: str) -> str:
         """Calculate render path for an aov
@@ -795,71 +899,70 @@ class TkRenderManNodeHandler(object):
             node (hou.Node): RenderMan node
             aov_name (str): AOV name
         """
-        is_lop = isinstance(node, hou.LopNode)
-
-        aov_name = aov_name[0].lower() + aov_name[1:]
-
-        current_filepath = hou.hipFile.path()
-
-        work_template = self.app.get_template("work_file_template")
-        render_template = self.app.get_template("output_render_template")
+        return self._apply_output_fields(self._get_output_fields(node), aov_name)
 
-        resolution_x_field = "resolutionx"
-        resolution_y_field = "resolutiony"
+    def _get_output_fields(self, node: hou.Node) -> dict:
+        """Get the render template fields of a node, apart from the aov name.
+        These are the same for every aov of the node, so they can be resolved
+        once and reused for all of its paths.
 
-        resolution_x = 0
-        resolution_y = 0
+        Args:
+            node (hou.Node): RenderMan node
+        """
+        is_lop = isinstance(node, hou.LopNode)
 
-        evaluate_parm = True
+        current_filepath = hou.hipFile.path()
 
         # Because RenderMan in the rop network uses different
         # parameter names, we need to change some bits
-        if not is_lop:
-            camera = node.parm("camera").eval()
-
-            evaluate_parm = False
-            resolution_x = hou.node(camera).parm("resx").eval()
-            resolution_y = hou.node(camera).parm("resy").eval()
-
-            if node.parm("override_camerares").eval():
-                res_fraction = node.parm("res_fraction").eval()
+        if is_lop:
+            resolution = node.evalParmTuple("resolution")
+        else:
+            res_fraction = None
+            if node.evalParm("override_camerares"):
+                res_fraction = node.evalParm("res_fraction")
 
-                if res_fraction == "specific":
-                    evaluate_parm = True
-                    resolution_x_field = "res_overridex"
-                    resolution_y_field = "res_overridey"
+            if res_fraction == "specific":
+                resolution = node.evalParmTuple("res_override")
+            else:
+                camera = hou.node(node.evalParm("camera"))
+                resolution = camera.evalParmTuple("res")
 
-                else:
-                    resolution_x = resolution_x * res_fraction
-                    resolution_y = resolution_y * res_fraction
+                if res_fraction is not None:
+                    resolution = (
+                        resolution[0] * res_fraction,
+                        resolution[1] * res_fraction,
+                    )
 
         # Set fields
-        fields = work_template.get_fields(current_filepath)
+        fields = self.app.get_work_fields(current_filepath)
         fields["SEQ"] = "FORMAT: $F"
-        fields["output"] = node.parm("name").eval()
-        fields["aov_name"] = aov_name
-        if evaluate_parm is True:
-            fields["width"] = node.parm(resolution_x_field).eval()
-            fields["height"] = node.parm(resolution_y_field).eval()
-        else:
-            fields["width"] = resolution_x
-            fields["height"] = resolution_y
+        fields["output"] = node.evalParm("name")
+        fields["width"], fields["height"] = resolution
+
+        return fields
 
-        return render_template.apply_fields(fields).replace(os.sep, "/")
+    def _apply_output_fields(self, fields: dict, aov_name: str) -> str:
+        """Calculate render path for an aov from the node its output fields
+
+        Args:
+            fields (dict): Output fields from _get_output_fields
+            aov_name (str): AOV name
+        """
+        fields["aov_name"] = aov_name[0].lower() + aov_name[1:]
+
+        path = self.app.get_render_template().apply_fields(fields)
+        return path.translate(SEP_TABLE) if SEP_TABLE else path
 
     def get_output_paths(self, node: hou.Node) -> list[str]:
         paths = []
 
         try:
+            output_fields = self._get_output_fields(node)
             output_files, active_files = self.get_active_files(node)
-            for file in active_files:
-                file: aov_file.OutputFile
-                if file.identifier == aov_file.OutputIdentifier.CRYPTOMATTE:
-                    for crypto in file.options:
-                        if node.parm(crypto.key).eval():
-                            paths.append(self.get_output_path(node, crypto.key))
-                else:
-                    paths.append(self.get_output_path(node, file.identifier.lower()))
+            paths.extend(
+                self._get_file_output_paths(node, active_files, output_fields).values()
+            )
         except Exception as e:
             self._error(
                 f'Something is wrong with one or more of the AOVs on node "{node.name()}"',
@@ -869,10 +972,10 @@ class TkRenderManNodeHandler(object):
 
         # Denoise
         if node.evalParm("denoise"):
-            paths.append(self.get_output_path(node, "denoise"))
+            paths.append(self._apply_output_fields(output_fields, "denoise"))
 
         # Statistiscs
-        paths.append(self.get_output_path(node, "stats")[:-3] + "xml")
+        paths.append(self._apply_output_fields(output_fields, "stats")[:-3] + "xml")
 
         return paths
 
@@ -913,18 +1016,13 @@ class TkRenderManNodeHandler(object):
         # Iterate trough filters
         for filter_type in filter_types:
             # Get amount of filters for filter type
-            filter_amount = node.parm("ri_%ss" % filter_type).eval()
-
-            # Iterate trough amount of existing filters
-            for filter_number in range(0, filter_amount):
-                # Create parameter name to search for values
-                parm_name = "ri_%s%s" % (filter_type, str(filter_number))
+            filter_amount = node.evalParm(f"ri_{filter_type}s")
 
-                # Get value of parameter
-                filter_parameter = node.parm(parm_name).eval()
-
-                # Add to list
-                filters.append(filter_parameter)
+            # Add the value of every existing filter to the list
+            filters.extend(
+                node.evalParm(f"ri_{filter_type}{filter_number}")
+                for filter_number in range(filter_amount)
+            )
 
         return filters
 
@@ -946,8 +1044,8 @@ class TkRenderManNodeHandler(object):
 
             for filter in filter_types:
                 # Get the correct group name
-                filter_type = filter + str(number)
-                filter_name = hou.encode("ri:%s:name" % filter_type)
+                filter_type = f"{filter}{number}"
+                filter_name = hou.encode(f"ri:{filter_type}:name")
 
                 # Get the ordered dropdown parameter value
                 filter_name = node.parm(filter_name).eval()
@@ -962,11 +1060,11 @@ class TkRenderManNodeHandler(object):
         return filters
 
     def get_filters_output(self, node: hou.Node):
-        if node.type().nameComponents()[2] == "sgtk_ris":
-            filter_passes = self.__get_filters_rop_output(node)
+        if isinstance(node, hou.LopNode):
+            filter_passes = self.__get_filters_lop_output(node)
 
         else:
-            filter_passes = self.__get_filters_lop_output(node)
+            filter_passes = self.__get_filters_rop_output(node)
 
         return filter_passes
 
@@ -1004,7 +1102,7 @@ class TkRenderManNodeHandler(object):
             value = item.get("value")
 
             # Build the paramater name
-            parameter_name = hou.encode("ri:" + group + ":" + value + ":filename")
+            parameter_name = hou.encode(f"ri:{group}:{value}:filename")
             parameter = node.parm(parameter_name)
 
             # If there is no "filename" parameter, skip this one
@@ -1038,10 +1136,10 @@ class TkRenderManNodeHandler(object):
 
         # Get the raw string from the picture parameter
 
-        if node.type().nameComponents()[2] == "sgtk_ris":
-            parameter = "ri_display_0"
-        else:
+        if isinstance(node, hou.LopNode):
             parameter = "picture"
+        else:
+            parameter = "ri_display_0"
 
         file_path = node.node("render").parm(parameter).rawValue()
 